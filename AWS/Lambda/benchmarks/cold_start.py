@@ -0,0 +1,124 @@
+"""
+Cold init and warm invocation latency of lambda_handler.py against a local DynamoDB.
+
+Starts moto's server (or uses --endpoint, e.g. dynamodb-local), creates and seeds the
+table, then runs each variant in --runs fresh interpreters, like a Lambda cold start:
+
+  * resource: the previous module layout, boto3.resource('dynamodb').Table(...) built at import
+  * client:   lambda_handler.py as shipped, with the lazily created low-level client
+
+For each it reports module init time, the first invocation (where the client variant
+builds its client), and p50/p99 of the following --invocations warm GET /api/product calls:
+
+    python cold_start.py --runs 10 --invocations 200
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+
+import boto3
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TABLE = "test-table"
+
+# Runs in a fresh interpreter; prints {"init": s, "first": s, "warm": [s, ...]}
+RUNNER = """
+import json, sys, time
+started = time.perf_counter()
+{setup}
+init = time.perf_counter() - started
+timings = []
+for _ in range({invocations} + 1):
+    started = time.perf_counter()
+    {invoke}
+    timings.append(time.perf_counter() - started)
+print(json.dumps({{"init": init, "first": timings[0], "warm": timings[1:]}}))
+"""
+
+VARIANTS = {
+    "resource": (
+        "import boto3\n"
+        f"table = boto3.resource('dynamodb').Table('{TABLE}')",
+        "json.dumps(table.get_item(Key={'Id': 'item-0'})['Item'], default=str)",
+    ),
+    "client": (
+        f"sys.path.insert(0, {LAMBDA_DIR!r})\n"
+        "import lambda_handler",
+        "lambda_handler.lambda_handler("
+        "{'httpMethod': 'GET', 'path': '/api/product', 'queryStringParameters': {'Id': 'item-0'}}, None)",
+    ),
+}
+
+
+def seed(endpoint: str, items: int):
+    client = boto3.client("dynamodb", endpoint_url=endpoint)
+    if TABLE not in client.list_tables()["TableNames"]:
+        client.create_table(
+            TableName=TABLE,
+            KeySchema=[{"AttributeName": "Id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "Id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+    for i in range(items):
+        client.put_item(
+            TableName=TABLE,
+            Item={"Id": {"S": f"item-{i}"}, "name": {"S": f"Product {i}"}, "price": {"N": str(i + 0.99)}},
+        )
+
+
+def run(variant: str, invocations: int, env: dict) -> dict:
+    setup, invoke = VARIANTS[variant]
+    script = RUNNER.format(setup=setup, invoke=invoke, invocations=invocations)
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", help="DynamoDB endpoint; starts a moto server when omitted")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--invocations", type=int, default=200)
+    parser.add_argument("--items", type=int, default=20)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.update(env)
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+    env["AWS_ENDPOINT_URL_DYNAMODB"] = endpoint
+    env["TABLE_NAME"] = TABLE
+
+    try:
+        seed(endpoint, args.items)
+        for variant in VARIANTS:
+            results = [run(variant, args.invocations, env) for _ in range(args.runs)]
+            init = statistics.median(r["init"] for r in results) * 1000
+            first = statistics.median(r["first"] for r in results) * 1000
+            warm = sorted(t * 1000 for r in results for t in r["warm"])
+            print(
+                f"{variant:9s} init {init:7.1f} ms  first call {first:7.1f} ms  cold total {init + first:7.1f} ms  "
+                f"warm p50 {statistics.median(warm):6.2f} ms  p99 {warm[int(len(warm) * 0.99) - 1]:6.2f} ms"
+            )
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
-import boto3
 import json
 import uuid
 import logging
+import os
 import base64
 from custom_encoder import CustomEncoder
+from dynamodb_client import from_item, get_client, to_item
+from pagination import InvalidPageRequest, fetch_page
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-dynamoDb = boto3.resource('dynamodb')
-table = dynamoDb.Table('product-inventory')
+table_name = os.environ.get('TABLE_NAME', 'product-inventory')
 
 base_path = '/api/v1/product-inventory'
 health_check = f'{base_path}/health'
@@ -36,9 +37,7 @@ def lambda_handler(event, context):
             return build_response(200, {"message": "success", "details": "Lambda is healthy", "data": None})
 
         elif method == 'GET' and path == products:
-            return build_response(200, {"data": get_products(), 
-                                        "message": "success",
-                                        "details":"Fetched all data from table product-inventory "})
+            return list_products(event.get('queryStringParameters'))
 
         elif method == 'GET' and path == product:
             product_id = event.get('queryStringParameters').get('product_id')
@@ -90,25 +89,26 @@ def lambda_handler(event, context):
         logger.error(f'Error: {e}')
         return build_response(500, {"message": "Internal Server Error", "details": f"Error: {e.args}"})
 
-def get_products():
+def list_products(params):
     try:
-        resp = table.scan()
-        result = resp.get('Items')
+        items, next_token = get_products(params)
+    except InvalidPageRequest as e:
+        return build_response(400, {"message": "Bad Request", "details": str(e), "data": None})
+    return build_response(200, {"data": items,
+                                "next_token": next_token,
+                                "message": "success",
+                                "details": f"Fetched {len(items)} items from table {table_name}"})
 
-        while 'LastEvaluatedKey' in resp:
-            resp = table.scan(ExclusiveStartKey=resp['LastEvaluatedKey'])
-            result.extend(resp['Items'])
-        logger.info("Reading all data from table product-inventory")
-        return result
-    except Exception as e:
-        logger.error(f'Error: {e}')
-        return []
+def get_products(params):
+    items, next_token = fetch_page(table_name, params)
+    logger.info(f"Read a page of {len(items)} items from table {table_name}")
+    return items, next_token
 
 
 def get_product_by_id(product_id):
     try:
-        resp = table.get_item(Key={'pid': product_id})
-        result = resp.get('Item')
+        resp = get_client().get_item(TableName=table_name, Key=to_item({'pid': product_id}))
+        result = from_item(resp['Item']) if 'Item' in resp else None
         logger.info(f'Reading Product from table product-inventory with key: {product_id}')
         return result
     except Exception as e:
@@ -118,7 +118,7 @@ def get_product_by_id(product_id):
 def create_product(product):
     try:
         product['pid'] = str(uuid.uuid4())
-        table.put_item(Item=product)
+        get_client().put_item(TableName=table_name, Item=to_item(product))
         logger.info('Creating Product in DynamoDB')
         return product['pid']
     except Exception as e:
@@ -128,9 +128,10 @@ def create_product(product):
 def update_product(product_id, product):
     try:
         update_expression, expression_attribute_values = generate_update_expression(product)
-        table.update_item( Key={'product_id': product_id}, 
-                            UpdateExpression=update_expression, 
-                            ExpressionAttributeValues=expression_attribute_values)
+        get_client().update_item(TableName=table_name,
+                                 Key=to_item({'product_id': product_id}),
+                                 UpdateExpression=update_expression,
+                                 ExpressionAttributeValues=to_item(expression_attribute_values))
         logger.info(f'Updating Product with key {product_id} in table product-inventory')
         return True
     except Exception as e:
@@ -152,7 +153,7 @@ def generate_update_expression(update_values:dict) -> (str, dict):
 
 def delete_product(product_id):
     try:
-        table.delete_item(Key={'pid': product_id})
+        get_client().delete_item(TableName=table_name, Key=to_item({'pid': product_id}))
         logger.info(f'Deleting Product with key {product_id} in table product-inventory')
         return True
     except Exception as e:
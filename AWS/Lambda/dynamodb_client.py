@@ -0,0 +1,61 @@
+"""
+Low-level DynamoDB client shared by the Lambda handlers in this directory.
+
+boto3 is imported and the client is built on first use, then cached at module level,
+so warm invocations reuse it together with its open connections and requests that
+never touch DynamoDB (e.g. the health check) skip the cost entirely. Point the client
+at a local stand-in (moto, dynamodb-local) with AWS_ENDPOINT_URL_DYNAMODB.
+"""
+import os
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("DYNAMODB_MAX_POOL_CONNECTIONS", "10"))
+CONNECT_TIMEOUT = float(os.environ.get("DYNAMODB_CONNECT_TIMEOUT", "2"))
+READ_TIMEOUT = float(os.environ.get("DYNAMODB_READ_TIMEOUT", "5"))
+MAX_ATTEMPTS = int(os.environ.get("DYNAMODB_MAX_ATTEMPTS", "3"))
+
+_client = None
+_serializer = None
+_deserializer = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        import boto3
+        from botocore.config import Config
+
+        _client = boto3.client(
+            "dynamodb",
+            config=Config(
+                tcp_keepalive=True,
+                max_pool_connections=MAX_POOL_CONNECTIONS,
+                connect_timeout=CONNECT_TIMEOUT,
+                read_timeout=READ_TIMEOUT,
+                # Client-side rate limiting on throttles instead of retrying into them
+                retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS},
+            ),
+        )
+    return _client
+
+
+def _types():
+    global _serializer, _deserializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+        _serializer, _deserializer = TypeSerializer(), TypeDeserializer()
+    return _serializer, _deserializer
+
+
+def serialize(value) -> dict:
+    """Python value to a DynamoDB attribute value, e.g. "a" -> {"S": "a"}."""
+    return _types()[0].serialize(value)
+
+
+def to_item(data: dict) -> dict:
+    return {key: serialize(value) for key, value in data.items()}
+
+
+def from_item(item: dict) -> dict:
+    deserializer = _types()[1]
+    return {key: deserializer.deserialize(value) for key, value in item.items()}
@@ -1,14 +1,15 @@
-import boto3
 import json
 import uuid
 import logging
+import os
 import base64
 from decimal import Decimal
+from dynamodb_client import from_item, get_client, to_item
+from pagination import InvalidPageRequest, fetch_page
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-dynamoDb = boto3.resource('dynamodb')
-table = dynamoDb.Table('test-table')
+table_name = os.environ.get('TABLE_NAME', 'test-table')
 
 base_path = '/api'
 product = f'{base_path}/product'
@@ -31,18 +32,16 @@ def lambda_handler(event, context):
                 body = json.loads(event.get('body'))
 
         elif method == 'GET' and path == product:
-            if queryParams := event.get('queryStringParameters', {}):
-                if Id := queryParams.get('Id', None):
-                    if product_data := get_product_by_id(Id):
-                        return build_response(200, {"data":product_data, 
-                                                    "message": "success",
-                                                    "details": f"Fetched data key {Id}"})
-                    else:
-                        return build_response(404, {"message": "Not Found", "details": f"Data with key {Id} not found", "data": None})
+            queryParams = event.get('queryStringParameters') or {}
+            if Id := queryParams.get('Id', None):
+                if product_data := get_product_by_id(Id):
+                    return build_response(200, {"data":product_data, 
+                                                "message": "success",
+                                                "details": f"Fetched data key {Id}"})
+                else:
+                    return build_response(404, {"message": "Not Found", "details": f"Data with key {Id} not found", "data": None})
             else:
-                return build_response(200, {"data": get_products(), 
-                                            "message": "success",
-                                            "details":"Fetched all data"})
+                return list_products(queryParams)
 
 
         elif method == 'POST' and path == product:
@@ -85,25 +84,26 @@ def lambda_handler(event, context):
         logger.error(f'Error: {e}')
         return build_response(500, {"message": "Internal Server Error", "details": f"Error: {e.args}"})
 
-def get_products():
+def list_products(params):
     try:
-        resp = table.scan()
-        result = resp.get('Items')
+        items, next_token = get_products(params)
+    except InvalidPageRequest as e:
+        return build_response(400, {"message": "Bad Request", "details": str(e), "data": None})
+    return build_response(200, {"data": items,
+                                "next_token": next_token,
+                                "message": "success",
+                                "details": f"Fetched {len(items)} items from table {table_name}"})
 
-        while 'LastEvaluatedKey' in resp:
-            resp = table.scan(ExclusiveStartKey=resp['LastEvaluatedKey'])
-            result.extend(resp['Items'])
-        logger.info("Reading all data from table")
-        return result
-    except Exception as e:
-        logger.error(f'Error: {e}')
-        return []
+def get_products(params):
+    items, next_token = fetch_page(table_name, params)
+    logger.info(f"Read a page of {len(items)} items from table {table_name}")
+    return items, next_token
 
 
 def get_product_by_id(Id):
     try:
-        resp = table.get_item(Key={'Id': Id})
-        result = resp.get('Item')
+        resp = get_client().get_item(TableName=table_name, Key=to_item({'Id': Id}))
+        result = from_item(resp['Item']) if 'Item' in resp else None
         logger.info(f'Reading data from table with key: {Id}')
         return result
     except Exception as e:
@@ -113,7 +113,7 @@ def get_product_by_id(Id):
 def create_product(product):
     try:
         product['Id'] = str(uuid.uuid4())
-        table.put_item(Item=product)
+        get_client().put_item(TableName=table_name, Item=to_item(product))
         logger.info('Creating Product in DynamoDB')
         return product['Id']
     except Exception as e:
@@ -123,9 +123,10 @@ def create_product(product):
 def update_product(Id, product):
     try:
         update_expression, expression_attribute_values = generate_update_expression(product)
-        table.update_item( Key={'Id': Id}, 
-                            UpdateExpression=update_expression, 
-                            ExpressionAttributeValues=expression_attribute_values)
+        get_client().update_item(TableName=table_name,
+                                 Key=to_item({'Id': Id}),
+                                 UpdateExpression=update_expression,
+                                 ExpressionAttributeValues=to_item(expression_attribute_values))
         logger.info(f'Updating with key {Id}')
         return True
     except Exception as e:
@@ -147,7 +148,7 @@ def generate_update_expression(update_values:dict) -> (str, dict):
 
 def delete_product(Id):
     try:
-        table.delete_item(Key={'Id': Id})
+        get_client().delete_item(TableName=table_name, Key=to_item({'Id': Id}))
         logger.info(f'Deleting data with key {Id}')
         return True
     except Exception as e:
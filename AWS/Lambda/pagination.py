@@ -0,0 +1,171 @@
+"""
+One page of a product listing per invocation, built from the request's query string:
+
+  limit=50               page size (DynamoDB's Limit: items read, before filters apply)
+  next_token=...         opaque token from the previous page, wraps LastEvaluatedKey
+  fields=name,price      ProjectionExpression
+  <attr>=value           filter, equality
+  <attr>__<op>=value     filter with op in ne, gt, gte, lt, lte, begins_with, contains
+
+An equality filter on the partition key of an index listed in PRODUCTS_INDEXES
+("index-name=attribute,...") is served with Query on that GSI instead of a Scan.
+"""
+import base64
+import binascii
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+from dynamodb_client import from_item, get_client, serialize
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("PRODUCTS_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.environ.get("PRODUCTS_MAX_PAGE_SIZE", "500"))
+PAGE_PARAMS = {"limit", "next_token", "fields"}
+COMPARISONS = {"eq": "=", "ne": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+FUNCTIONS = {"begins_with", "contains"}
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def parse_indexes(spec: str) -> Dict[str, str]:
+    """Parse "category-index=category,brand-index=brand" into {index name: partition attribute}."""
+    indexes = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, attribute = entry.partition("=")
+        if not attribute:
+            raise ValueError(f"PRODUCTS_INDEXES entry '{entry}' should be index-name=attribute")
+        indexes[name.strip()] = attribute.strip()
+    return indexes
+
+
+INDEXES = parse_indexes(os.environ.get("PRODUCTS_INDEXES", ""))
+
+
+def encode_token(last_key: dict, index: Optional[str]) -> str:
+    state = json.dumps({"k": last_key, "i": index}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(state.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str, index: Optional[str]) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        last_key, token_index = state["k"], state["i"]
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise InvalidPageRequest(f"Malformed next_token: {e}")
+    if not isinstance(last_key, dict) or token_index != index:
+        # Tokens from a scan and from an index query are not interchangeable
+        raise InvalidPageRequest("next_token does not belong to this query")
+    return last_key
+
+
+def _number(text: str) -> Optional[Decimal]:
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+class _Expression:
+    """Placeholders for attribute names and values, so reserved words are safe to filter on."""
+
+    def __init__(self):
+        self.names: Dict[str, str] = {}
+        self.values: Dict[str, dict] = {}
+
+    def name(self, attribute: str) -> str:
+        for placeholder, existing in self.names.items():
+            if existing == attribute:
+                return placeholder
+        placeholder = f"#n{len(self.names)}"
+        self.names[placeholder] = attribute
+        return placeholder
+
+    def value(self, value) -> str:
+        placeholder = f":v{len(self.values)}"
+        self.values[placeholder] = serialize(value)
+        return placeholder
+
+    def condition(self, attribute: str, operator: str, text: str) -> str:
+        name = self.name(attribute)
+        if operator in FUNCTIONS:
+            return f"{operator}({name}, {self.value(text)})"
+        number = _number(text)
+        if operator == "eq" and number is not None:
+            # Query strings carry no type; "10" matches a stored number or string
+            return f"({name} = {self.value(text)} OR {name} = {self.value(number)})"
+        return f"{name} {COMPARISONS[operator]} {self.value(number if number is not None else text)}"
+
+
+def parse_filters(params: dict) -> List[Tuple[str, str, str]]:
+    filters = []
+    for key, text in params.items():
+        if key in PAGE_PARAMS:
+            continue
+        attribute, _, operator = key.rpartition("__")
+        if not attribute or operator not in COMPARISONS.keys() | FUNCTIONS:
+            attribute, operator = key, "eq"
+        filters.append((attribute, operator, text))
+    return filters
+
+
+def parse_limit(text: Optional[str]) -> int:
+    if text is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(text)
+    except ValueError:
+        raise InvalidPageRequest(f"limit must be an integer, got '{text}'")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidPageRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def fetch_page(table_name: str, params: Optional[dict], indexes: Dict[str, str] = INDEXES) -> Tuple[List[dict], Optional[str]]:
+    """
+    Read one page of `table_name`. Returns the items and the token for the next page,
+    or None once the table (or index partition) is exhausted. A filtered page can hold
+    fewer than `limit` items, or none, and still have a next page.
+    """
+    params = params or {}
+    expression = _Expression()
+    request = {"TableName": table_name, "Limit": parse_limit(params.get("limit"))}
+
+    filters = parse_filters(params)
+    index = next(
+        (
+            name
+            for name, partition in indexes.items()
+            if any(attribute == partition and operator == "eq" for attribute, operator, _ in filters)
+        ),
+        None,
+    )
+    if index is not None:
+        partition = indexes[index]
+        key_filter = next(f for f in filters if f[0] == partition and f[1] == "eq")
+        filters.remove(key_filter)
+        request["IndexName"] = index
+        # GSI partition keys are taken to be strings
+        request["KeyConditionExpression"] = f"{expression.name(partition)} = {expression.value(key_filter[2])}"
+
+    if filters:
+        request["FilterExpression"] = " AND ".join(
+            expression.condition(attribute, operator, text) for attribute, operator, text in filters
+        )
+    if fields := [field.strip() for field in params.get("fields", "").split(",") if field.strip()]:
+        request["ProjectionExpression"] = ", ".join(expression.name(field) for field in dict.fromkeys(fields))
+    if token := params.get("next_token"):
+        request["ExclusiveStartKey"] = decode_token(token, index)
+    if expression.names:
+        request["ExpressionAttributeNames"] = expression.names
+    if expression.values:
+        request["ExpressionAttributeValues"] = expression.values
+
+    client = get_client()
+    resp = client.query(**request) if index is not None else client.scan(**request)
+    items = [from_item(item) for item in resp.get("Items", [])]
+    next_token = encode_token(resp["LastEvaluatedKey"], index) if "LastEvaluatedKey" in resp else None
+    return items, next_token
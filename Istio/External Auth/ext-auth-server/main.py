@@ -1,7 +1,20 @@
+import os
 from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import JSONResponse
+from prometheus_client import start_http_server
+from metrics import instrument
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
 
 app = FastAPI()
+# Every path on this app is an authorization decision, so metrics get their own port
+instrument(app)
+
+
+@app.on_event("startup")
+def serve_metrics():
+    start_http_server(METRICS_PORT)
+
 
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"])
 async def auth(path:str, role: str = Header(default=None)):
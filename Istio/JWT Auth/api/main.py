@@ -3,7 +3,9 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from typing import Dict, List
 from pydantic import BaseModel
-import json, uvicorn
+import json, os, uvicorn
+from responses import CompressionMiddleware, FastJSONResponse
+from metrics import setup_metrics
 
 router = APIRouter(prefix="/api/v1")
 
@@ -143,7 +145,9 @@ def delete_item(item_id: int):
         return {"error": str(e)}
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")))
+setup_metrics(app)
 app.include_router(router)
 
 if __name__ == "__main__":
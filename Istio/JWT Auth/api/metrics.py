@@ -0,0 +1,171 @@
+"""
+Prometheus instrumentation shared by the FastAPI services: per-route request
+counts, latency histograms and in-flight gauges, downstream call timings and
+cache hit/miss counters, all served on GET /metrics. Each service keeps its own
+copy of this module next to its main.py; keep the copies identical.
+
+Metrics live in the process-wide default registry, so run one worker per
+container (as the Dockerfiles do) and let Prometheus scrape every replica.
+"""
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    from pymongo import monitoring
+except ImportError:
+    monitoring = None
+
+# Seconds; covers cache hits (sub-millisecond) up to slow bcrypt logins and image fetches
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 404s and 405s share one label value so scans of random paths cannot blow up cardinality
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the last response byte",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served", ["method"])
+DOWNSTREAM_LATENCY = Histogram(
+    "downstream_call_duration_seconds",
+    "Calls to MinIO/S3, MongoDB, bcrypt and other dependencies",
+    ["target", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the route that served `scope`, e.g. `/notes/{note_id}`. The router
+    records the matched route in the scope, so this is read once the app has run.
+    """
+    return getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """
+    Record count and latency per (method, route template) and requests in flight per
+    method. Latency runs until the final body chunk is sent, so streamed responses are
+    timed in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        in_flight = IN_FLIGHT.labels(method)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            in_flight.dec()
+
+
+@contextmanager
+def observe_downstream(target: str, operation: str):
+    """Time the enclosed call into DOWNSTREAM_LATENCY, labelled `ok` or `error`."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        DOWNSTREAM_LATENCY.labels(target, operation, outcome).observe(time.perf_counter() - started)
+
+
+if monitoring is not None:
+
+    class MongoCommandMetrics(monitoring.CommandListener):
+        """
+        pymongo command listener timing every command the driver sends (aggregate,
+        find, getMore, insert, ...). Pass it to the client via `event_listeners=[...]`.
+        """
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            DOWNSTREAM_LATENCY.labels("mongodb", event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+        def failed(self, event):
+            DOWNSTREAM_LATENCY.labels("mongodb", event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+class CacheCollector:
+    """
+    Exposes `cache_hits_total` / `cache_misses_total` per cache from counters the
+    caches already keep, read at scrape time; the hit ratio is
+    `rate(cache_hits_total[5m]) / (rate(cache_hits_total[5m]) + rate(cache_misses_total[5m]))`.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+    def add(self, name: str, source: Callable[[], Tuple[int, int]]):
+        self._sources[name] = source
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups answered from the cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that went to the backing store", labels=["cache"])
+        for name, source in self._sources.items():
+            hit_count, miss_count = source()
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], miss_count)
+        yield hits
+        yield misses
+
+
+caches = CacheCollector()
+REGISTRY.register(caches)
+
+
+def register_cache(name: str, source: Callable[[], Tuple[int, int]]):
+    """Report a cache's (hits, misses) counters on /metrics under `cache=name`."""
+    caches.add(name, source)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrument(app):
+    """
+    Record request metrics for `app` without serving them, for apps where every path
+    carries meaning (e.g. an ext-authz server); expose them with
+    prometheus_client.start_http_server on a separate port instead.
+    """
+    app.add_middleware(MetricsMiddleware)
+
+
+def setup_metrics(app):
+    """
+    Instrument `app` and serve GET /metrics. Call it after the other add_middleware
+    calls, so the timings include them.
+    """
+    instrument(app)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
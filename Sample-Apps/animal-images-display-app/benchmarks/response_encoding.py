@@ -0,0 +1,114 @@
+"""
+Serialization time and bytes on the wire for the shared response layer
+(data-service/responses.py, copied into the notes backend and the Istio items API).
+
+Three payloads shaped like the real responses are encoded with FastAPI's default
+path (jsonable_encoder + JSONResponse) and with FastJSONResponse, then compressed
+with gzip and brotli at the levels the services use by default:
+
+    python response_encoding.py
+    python response_encoding.py --repeat 50 --gzip-level 6 --brotli-quality 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "data-service"))
+
+from responses import FastJSONResponse, brotli, orjson  # noqa: E402
+
+WORDS = "the quick brown fox jumps over lazy dog cat image album note meeting todo idea".split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def data_service_page(rng: random.Random) -> list:
+    return [
+        {
+            "id": rng.randrange(1_000_000),
+            "color": f"#{rng.randrange(0xFFFFFF):06x}",
+            "image_url": f"http://app.devopsguru.engineer/images/cats/{rng.randrange(1_000_000)}",
+            "likes": rng.randrange(10_000),
+            "description": sentence(rng, 12),
+            "user": {"name": sentence(rng, 2), "location": sentence(rng, 2)},
+        }
+        for _ in range(16)
+    ]
+
+
+def notes_page(rng: random.Random) -> list:
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(ObjectId()),
+            "title": sentence(rng, 4),
+            "content": sentence(rng, 60),
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+        }
+        for i in range(1000)
+    ]
+
+
+def items_page(rng: random.Random) -> list:
+    return [
+        {"id": i, "name": f"Item {i}", "quantity": rng.randrange(100), "cost": round(rng.uniform(1, 100), 2), "apiVersion": "v1"}
+        for i in range(10_000)
+    ]
+
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def run(name: str, payload: list, repeat: int, gzip_level: int, brotli_quality: int):
+    default_body, default_ms = timed(lambda: JSONResponse(jsonable_encoder(payload)).body, repeat)
+    fast_body, fast_ms = timed(lambda: FastJSONResponse(payload).body, repeat)
+
+    def gzip_compress():
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(fast_body) + compressor.flush()
+
+    gzip_body, gzip_ms = timed(gzip_compress, repeat)
+    print(f"{name}")
+    print(f"  default JSONResponse: {default_ms:8.2f} ms  {len(default_body) / 1024:8.1f} KiB")
+    print(f"  FastJSONResponse:     {fast_ms:8.2f} ms  {len(fast_body) / 1024:8.1f} KiB")
+    print(f"  gzip level {gzip_level}:         {gzip_ms:8.2f} ms  {len(gzip_body) / 1024:8.1f} KiB")
+    if brotli is not None:
+        br_body, br_ms = timed(lambda: brotli.compress(fast_body, quality=brotli_quality), repeat)
+        print(f"  brotli quality {brotli_quality}:     {br_ms:8.2f} ms  {len(br_body) / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--brotli-quality", type=int, default=4)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson not installed, FastJSONResponse uses the json fallback")
+    if brotli is None:
+        print("brotli not installed, skipping brotli")
+
+    rng = random.Random(0)
+    run("data-service page (16 records)", data_service_page(rng), args.repeat, args.gzip_level, args.brotli_quality)
+    run("GET /notes (1000 notes)", notes_page(rng), args.repeat, args.gzip_level, args.brotli_quality)
+    run("GET /api/v1/items (10k items)", items_page(rng), args.repeat, args.gzip_level, args.brotli_quality)
+
+
+if __name__ == "__main__":
+    main()
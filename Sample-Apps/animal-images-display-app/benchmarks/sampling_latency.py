@@ -0,0 +1,110 @@
+"""
+Latency of data-service sampling strategies against collection size.
+
+Seeds `sampling_bench.animals_<n>` collections (reused on later runs when the document
+count already matches) and times the legacy `$addFields` -> `$sample` pipeline against
+every strategy in data-service/sampling.py:
+
+    python sampling_latency.py --mongo-uri mongodb://localhost:27017 --sizes 10000 1000000 10000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "data-service"))
+
+from sampling import (  # noqa: E402
+    IdCacheStrategy,
+    RandomKeyStrategy,
+    SampleStrategy,
+    ensure_id_index,
+    ensure_random_keys,
+)
+
+IMAGE_SERVICE = "http://image-service/images"
+COLORS = ["#1f2937", "#f59e0b", "#10b981", "#3b82f6", "#ef4444"]
+
+
+async def seed(collection, size: int, batch: int = 10_000):
+    if await collection.estimated_document_count() == size:
+        return
+    await collection.drop()
+    for start in range(0, size, batch):
+        await collection.insert_many(
+            [
+                {
+                    "id": i,
+                    "color": random.choice(COLORS),
+                    "likes": random.randint(0, 5000),
+                    "description": f"A very good animal number {i}",
+                    "user": {"name": f"user{i % 997}", "location": "Somewhere", "email": f"user{i}@example.com"},
+                }
+                for i in range(start, min(start + batch, size))
+            ],
+            ordered=False,
+        )
+    await ensure_random_keys(collection)
+    await ensure_id_index(collection)
+
+
+def legacy_sample(collection, animal: str, size: int):
+    pipeline = [
+        {"$addFields": {"image_url": {"$concat": [IMAGE_SERVICE, "/", animal, "/", {"$toString": "$id"}]}}},
+        {"$sample": {"size": size}},
+        {"$project": {"_id": 0, "id": 1, "color": 1, "image_url": 1, "likes": 1, "description": 1,
+                      "user": {"name": 1, "location": 1}}},
+    ]
+    return collection.aggregate(pipeline)
+
+
+async def measure(sample, collection, animal: str, page_size: int, iterations: int):
+    timings = []
+    for i in range(iterations + 1):
+        start = time.perf_counter()
+        records = [record async for record in sample(collection, animal, page_size)]
+        assert len(records) == page_size, f"sample returned {len(records)} records, expected {page_size}"
+        if i == 0:
+            continue
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[max(int(len(timings) * 0.99) - 1, 0)]
+
+
+async def run(args):
+    database = AsyncIOMotorClient(args.mongo_uri)["sampling_bench"]
+    strategies = {
+        "legacy $addFields+$sample": legacy_sample,
+        "sample": SampleStrategy(IMAGE_SERVICE).sample,
+        "random_key": RandomKeyStrategy(IMAGE_SERVICE).sample,
+        "id_cache": IdCacheStrategy(IMAGE_SERVICE, ttl=3600).sample,
+    }
+
+    print(f"{'docs':>10}  {'strategy':<26}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in args.sizes:
+        animal = f"animals_{size}"
+        collection = database[animal]
+        await seed(collection, size)
+        for label, sample in strategies.items():
+            p50, p99 = await measure(sample, collection, animal, args.page_size, args.iterations)
+            print(f"{size:>10}  {label:<26}{p50:>10.2f}{p99:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=16)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
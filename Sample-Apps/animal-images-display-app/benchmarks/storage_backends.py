@@ -0,0 +1,150 @@
+"""
+Compare p50/p99 latency and throughput of the image-service storage backends.
+
+Each backend streams the same seeded objects with a fixed number of concurrent
+readers. The S3-compatible backends (minio, s3) talk to a local moto server unless
+--endpoint points at a real MinIO:
+
+    python storage_backends.py --requests 2000 --concurrency 32
+    python storage_backends.py --endpoint localhost:9000 --access-key minioadmin --secret-key minioadmin
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "image-service"))
+
+from executors import InstrumentedThreadPoolExecutor  # noqa: E402
+from storage import FilesystemBackend, MinioBackend, S3Backend  # noqa: E402
+
+BUCKET = "bench-images"
+
+
+def seed_s3(endpoint: str, access_key: str, secret_key: str, names, payload: bytes):
+    import boto3
+
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=f"http://{endpoint}",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name="us-east-1",
+    )
+    try:
+        s3.create_bucket(Bucket=BUCKET)
+    except s3.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    for name in names:
+        s3.put_object(Bucket=BUCKET, Key=name, Body=payload)
+
+
+def seed_filesystem(root: str, names, payload: bytes):
+    for name in names:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(payload)
+
+
+async def drain(backend, name: str) -> int:
+    chunks = await backend.open(name)
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+async def run(backend, names, requests: int, concurrency: int):
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(names[i % len(names)])
+
+    async def worker():
+        while not queue.empty():
+            name = queue.get_nowait()
+            start = time.perf_counter()
+            await drain(backend, name)
+            latencies.append(time.perf_counter() - start)
+
+    await drain(backend, names[0])
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await backend.close()
+
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "rps": len(latencies) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", help="host:port of an S3-compatible server; starts moto when omitted")
+    parser.add_argument("--access-key", default="bench")
+    parser.add_argument("--secret-key", default="bench")
+    parser.add_argument("--objects", type=int, default=64)
+    parser.add_argument("--object-size", type=int, default=200 * 1024)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=16, help="thread pool size for blocking backends")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    names = [f"cats/{i}.jpg" for i in range(args.objects)]
+    payload = os.urandom(args.object_size)
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        from moto.server import ThreadedMotoServer
+
+        server = ThreadedMotoServer(port=0, verbose=False)
+        server.start()
+        endpoint = f"127.0.0.1:{server.get_host_and_port()[1]}"
+    seed_s3(endpoint, args.access_key, args.secret_key, names, payload)
+
+    root = tempfile.mkdtemp(prefix="image-bench-")
+    seed_filesystem(root, names, payload)
+
+    def minio_backend(executor):
+        from minio import Minio
+
+        client = Minio(endpoint, access_key=args.access_key, secret_key=args.secret_key, secure=False)
+        return MinioBackend(client, BUCKET, executor, args.chunk_size)
+
+    def s3_backend(executor):
+        return S3Backend(
+            endpoint_url=f"http://{endpoint}",
+            access_key=args.access_key,
+            secret_key=args.secret_key,
+            bucket=BUCKET,
+            chunk_size=args.chunk_size,
+            max_pool_connections=args.concurrency,
+        )
+
+    def filesystem_backend(executor):
+        return FilesystemBackend(root, executor, args.chunk_size)
+
+    print(f"{args.requests} reads of {args.object_size // 1024} KiB, concurrency {args.concurrency}")
+    print(f"{'backend':<12}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    try:
+        for label, factory in (("minio", minio_backend), ("s3", s3_backend), ("filesystem", filesystem_backend)):
+            executor = InstrumentedThreadPoolExecutor(max_workers=args.workers)
+            result = asyncio.run(run(factory(executor), names, args.requests, args.concurrency))
+            executor.shutdown()
+            print(f"{label:<12}{result['p50']:>10.2f}{result['p99']:>10.2f}{result['rps']:>10.0f}")
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
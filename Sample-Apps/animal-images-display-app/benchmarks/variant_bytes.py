@@ -0,0 +1,86 @@
+"""
+Compare bytes served for one gallery page (16 tiles) with and without image variants.
+
+Live mode fetches a page from data-service and downloads every tile from image-service
+twice, once as the original and once with the variant query string:
+
+    python variant_bytes.py --data-url http://localhost:8080 --animal cats
+
+Without --data-url the benchmark renders synthetic photo-sized JPEGs locally with the
+same render_variant function image-service uses.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from io import BytesIO
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "image-service"))
+
+PAGE_SIZE = 16
+
+
+def fetch(url: str) -> bytes:
+    with urlopen(url) as response:
+        return response.read()
+
+
+def live_page(data_url: str, animal: str, query: str):
+    records = json.loads(fetch(f"{data_url.rstrip('/')}/{animal}"))
+    original = variant = 0
+    for record in records:
+        original += len(fetch(record["image_url"]))
+        variant += len(fetch(f"{record['image_url']}?{query}"))
+    return len(records), original, variant
+
+
+def synthetic_page(width: int, quality: int, fmt: str, source_width: int):
+    from PIL import Image
+    from variants import Variant, render_variant
+
+    variant = Variant(width=width, quality=quality, fmt=fmt)
+    original = rendered = 0
+    render_time = 0.0
+    for i in range(PAGE_SIZE):
+        image = Image.effect_noise((source_width, source_width * 2 // 3), 40 + i).convert("RGB")
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        data = buffer.getvalue()
+
+        start = time.perf_counter()
+        rendered += len(render_variant(data, variant))
+        render_time += time.perf_counter() - start
+        original += len(data)
+    return PAGE_SIZE, original, rendered, render_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-url", help="data-service base URL; synthetic mode when omitted")
+    parser.add_argument("--animal", default="cats")
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--fmt", default="webp")
+    parser.add_argument("--source-width", type=int, default=1920, help="synthetic image width")
+    args = parser.parse_args()
+
+    if args.data_url:
+        query = urlencode({"w": args.width, "q": args.quality, "fmt": args.fmt})
+        count, original, variant = live_page(args.data_url, args.animal, query)
+        render_note = ""
+    else:
+        count, original, variant, render_time = synthetic_page(args.width, args.quality, args.fmt, args.source_width)
+        render_note = f", render {render_time / count * 1000:.1f} ms/image"
+
+    print(f"tiles: {count}")
+    print(f"original: {original / 1024:.1f} KiB/page")
+    print(f"w={args.width} q={args.quality} fmt={args.fmt}: {variant / 1024:.1f} KiB/page{render_note}")
+    if variant:
+        print(f"reduction: {original / variant:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
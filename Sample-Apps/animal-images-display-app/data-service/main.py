@@ -1,8 +1,18 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from typing import AsyncIterator
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic_settings import BaseSettings
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from sampling import create_strategy, ensure_random_keys, ensure_id_index, pipeline_cache_info
+from pools import SamplePools
+from registry import CollectionRegistry
+from responses import CompressionMiddleware, FastJSONResponse, dumps
+from metrics import MongoCommandMetrics, register_cache, setup_metrics
+from pagination import ORDERS, InvalidCursor, decode_cursor, encode_cursor, fetch_page, has_random_key_index, seed_start
 import uvicorn
 
 
@@ -10,49 +20,163 @@ class Config(BaseSettings):
     mongo_uri: str = "mongodb://mongo.animal-album:27017"
     image_service: str = "http://app.devopsguru.engineer/images"
     port: int = 8080
+    sampling_strategy: str = "sample"
+    sampling_prepare: bool = False
+    id_cache_ttl: float = 300.0
+    page_size: int = 16
+    max_page_size: int = 100
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: int = 60000
+    mongo_connect_timeout_ms: int = 3000
+    mongo_server_selection_timeout_ms: int = 3000
+    mongo_socket_timeout_ms: int = 10000
+    pool_enabled: bool = False
+    pool_size: int = 512
+    pool_ttl: float = 60.0
+    pool_refresh_concurrency: int = 2
+    pool_change_streams: bool = False
+    collection_refresh_interval: float = 60.0
+    compress_min_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
 
+logging.basicConfig(level=logging.INFO)
 load_dotenv()
 config = Config()
-mongo_client = MongoClient(config.mongo_uri)
+mongo_client = AsyncIOMotorClient(
+    config.mongo_uri,
+    maxPoolSize=config.mongo_max_pool_size,
+    minPoolSize=config.mongo_min_pool_size,
+    maxIdleTimeMS=config.mongo_max_idle_time_ms,
+    connectTimeoutMS=config.mongo_connect_timeout_ms,
+    serverSelectionTimeoutMS=config.mongo_server_selection_timeout_ms,
+    socketTimeoutMS=config.mongo_socket_timeout_ms,
+    event_listeners=[MongoCommandMetrics()],
+)
+sampler = create_strategy(config.sampling_strategy, config.image_service, config.id_cache_ttl)
+sample_pools = SamplePools(sampler, config.pool_size, config.pool_ttl, config.pool_refresh_concurrency)
+collections = CollectionRegistry(mongo_client["data"], config.collection_refresh_interval, sample_pools.discard)
 
-app=FastAPI()
+app=FastAPI(default_response_class=FastJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.compress_min_size,
+    gzip_level=config.gzip_level,
+    brotli_quality=config.brotli_quality,
+)
+setup_metrics(app)
+register_cache("sample_pools", lambda: (sample_pools.hits, sample_pools.misses))
+register_cache("pipelines", lambda: (pipeline_cache_info()["hits"], pipeline_cache_info()["misses"]))
+# A miss is a request for an animal that has no collection, rejected with 404
+register_cache("collections", lambda: (collections.hits, collections.misses))
+
+
+@app.on_event("startup")
+async def load_collections():
+    try:
+        await collections.refresh()
+        logging.info(f"Serving {len(collections.names)} animal collections")
+    except Exception as e:
+        logging.warning(f"Loading collection registry failed, accepting every name until the next refresh: {e}")
+    asyncio.ensure_future(collections.watch())
+
+
+@app.on_event("startup")
+async def prepare_sampling():
+    """Backfill random keys / build the indexes the configured sampling strategy relies on."""
+    if not config.sampling_prepare:
+        return
+    database = mongo_client["data"]
+    for animal in await database.list_collection_names():
+        if config.sampling_strategy == "random_key":
+            await ensure_random_keys(database[animal])
+        elif config.sampling_strategy == "id_cache":
+            await ensure_id_index(database[animal])
+
+
+@app.on_event("startup")
+async def watch_sample_pools():
+    if config.pool_enabled and config.pool_change_streams:
+        asyncio.ensure_future(sample_pools.watch(mongo_client["data"]))
+
+
+@app.get("/pools/stats")
+async def pool_stats():
+    return sample_pools.snapshot()
+
+
+@app.get("/collections/stats")
+async def collection_stats():
+    return {**collections.snapshot(), "pipeline_cache": pipeline_cache_info()}
+
+
+def get_collection(animal: str):
+    if animal not in collections:
+        raise HTTPException(status_code=404, detail=f"Unknown animal '{animal}'")
+    return mongo_client["data"][animal]
+
+
+async def stream_json_array(first: dict, records: AsyncIterator[dict]):
+    """Serialize records one at a time as they come off the cursor instead of building a list."""
+    yield b"[" + dumps(first)
+    async for record in records:
+        yield b"," + dumps(record)
+    yield b"]"
+
+
+@app.get("/{animal}/page")
+async def get_animal_page(
+    animal: str,
+    size: int = Query(None, ge=1, le=config.max_page_size),
+    order: str = "id",
+    seed: str = None,
+    cursor: str = None,
+):
+    """
+    Infinite-scroll mode: returns `{"records": [...], "next_cursor": ...}`. Pass
+    `next_cursor` back as `cursor` to continue without duplicates; it is null once
+    the collection is exhausted. `rotated` order relies on the indexed `rand` field
+    (see SAMPLING_PREPARE with the random_key strategy) and answers 409 without it.
+    """
+    collection = get_collection(animal)
+    if cursor:
+        try:
+            state = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif order not in ORDERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported order '{order}', expected one of {list(ORDERS)}")
+    elif order == "id":
+        state = {"o": "id"}
+    else:
+        state = {"o": "rotated", "s": seed_start(seed)}
+    if state["o"] == "rotated" and not await has_random_key_index(collection):
+        # Without `rand` on the documents the walk would silently come back empty
+        raise HTTPException(
+            status_code=409,
+            detail="order=rotated needs the indexed `rand` field, see SAMPLING_PREPARE with SAMPLING_STRATEGY=random_key",
+        )
+
+    records, next_state = await fetch_page(
+        collection, config.image_service, animal, state, size or config.page_size
+    )
+    return FastJSONResponse({"records": records, "next_cursor": encode_cursor(next_state) if next_state else None})
 
 
 @app.get("/{animal}")
-def get_animal_details(animal: str):
-    pipeline = [
-        {
-            "$addFields": {
-                "image_url": {
-                    "$concat": [
-                        config.image_service, "/", animal, "/", {"$toString": "$id"}
-                    ]
-                }
-            }
-        },
-        {
-            "$sample": {
-                "size": 16
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "id": 1, 
-                "color": 1,
-                "image_url": 1,
-                "likes": 1,
-                "description": 1,
-                "user":{
-                    "name": 1,
-                    "location": 1
-                }
-            }
-        }
-    ]
-    records = mongo_client["data"][animal].aggregate(pipeline)
-    return list(records)
+async def get_animal_details(animal: str):
+    collection = get_collection(animal)
+    if config.pool_enabled:
+        return FastJSONResponse(await sample_pools.draw(collection, animal, config.page_size))
+
+    records = sampler.sample(collection, animal, config.page_size)
+    # Pull the first record before responding so database errors still surface as a 500
+    first = await anext(records, None)
+    if first is None:
+        return []
+    return StreamingResponse(stream_json_array(first, records), media_type="application/json")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=config.port)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import base64
+import binascii
+import random
+from typing import List, Optional, Set, Tuple
+
+from bson import ObjectId, json_util
+
+from sampling import RANDOM_KEY_FIELD, project_stage
+
+ORDERS = ("rotated", "id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        state = json_util.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(state, dict) or state.get("o") not in ORDERS or not _valid_state(state):
+        raise InvalidCursor("Malformed cursor")
+    return state
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _valid_state(state: dict) -> bool:
+    last = state.get("k")
+    if state["o"] == "id":
+        return last is None or isinstance(last, ObjectId)
+    return (
+        _is_number(state.get("s"))
+        and 0 <= state["s"] < 1
+        and state.get("p", 1) in (1, 2)
+        and (last is None or _is_number(last))
+    )
+
+
+def seed_start(seed: Optional[str]) -> float:
+    return random.Random(seed).random() if seed is not None else random.random()
+
+
+_indexed: Set[str] = set()
+
+
+async def has_random_key_index(collection) -> bool:
+    """
+    Whether `collection` has the `rand` index that ensure_random_keys builds after the
+    backfill; a positive answer is remembered, a negative one checked again next time.
+    """
+    if collection.full_name in _indexed:
+        return True
+    async for index in collection.list_indexes():
+        if next(iter(index["key"])) == RANDOM_KEY_FIELD:
+            _indexed.add(collection.full_name)
+            return True
+    return False
+
+
+async def _query(collection, image_service: str, animal: str, key: str, match: dict, size: int) -> List[dict]:
+    pipeline = [
+        {"$match": match},
+        {"$sort": {key: 1}},
+        {"$limit": size},
+        project_stage(image_service, animal, extra={key: 1}),
+    ]
+    return [record async for record in collection.aggregate(pipeline)]
+
+
+async def fetch_page(
+    collection,
+    image_service: str,
+    animal: str,
+    state: dict,
+    size: int,
+) -> Tuple[List[dict], Optional[dict]]:
+    """
+    Keyset pagination; every page is an index range scan with a bounded limit.
+
+    `rotated` walks the indexed random key from a seeded start point and wraps around
+    once. Every seed walks the same fixed random order, only entered at a different
+    point, so neighbours repeat across seeds; it is not a per-seed shuffle, which could
+    not be served from an index. `id` walks `_id`.
+    Returns the page and the cursor state for the next one (None when exhausted).
+    """
+    if state["o"] == "id":
+        match = {} if state.get("k") is None else {"_id": {"$gt": state["k"]}}
+        records = await _query(collection, image_service, animal, "_id", match, size)
+        if len(records) < size:
+            next_state = None
+        else:
+            next_state = {"o": "id", "k": records[-1]["_id"]}
+        for record in records:
+            del record["_id"]
+        return records, next_state
+
+    start, phase, last = state["s"], state.get("p", 1), state.get("k")
+    records = []
+    while phase <= 2:
+        bounds = {"$gte": start} if phase == 1 else {"$lt": start}
+        if last is not None:
+            bounds["$gt"] = last
+        records += await _query(collection, image_service, animal, RANDOM_KEY_FIELD, {RANDOM_KEY_FIELD: bounds}, size - len(records))
+        if len(records) == size:
+            last = records[-1][RANDOM_KEY_FIELD]
+            break
+        phase, last = phase + 1, None
+
+    next_state = {"o": "rotated", "s": start, "p": phase, "k": last} if phase <= 2 else None
+    for record in records:
+        record.pop(RANDOM_KEY_FIELD, None)
+    return records, next_state
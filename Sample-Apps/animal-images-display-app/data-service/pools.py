@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SamplePool:
+    records: List[dict] = field(default_factory=list)
+    loaded_at: float = 0.0
+    stale: bool = False
+    refresh: Optional[asyncio.Task] = None
+
+
+class SamplePools:
+    """
+    Per-animal pools of already projected records. Requests draw a random page from
+    the pool without touching MongoDB; a pool older than `ttl` keeps serving while a
+    background task replaces it. Only the very first request for an animal waits on
+    the database.
+    """
+
+    def __init__(self, sampler, pool_size: int, ttl: float, refresh_concurrency: int):
+        self.sampler = sampler
+        self.pool_size = pool_size
+        self.ttl = ttl
+        self._pools: Dict[str, SamplePool] = {}
+        self._refresh_slots = asyncio.Semaphore(refresh_concurrency)
+        # A miss is a draw that had to wait for MongoDB; stale pools still count as hits
+        self.hits = 0
+        self.misses = 0
+
+    async def _load(self, collection, animal: str, pool: SamplePool):
+        # Cleared before sampling, so a change that lands mid-refresh marks it stale again
+        pool.stale = False
+        async with self._refresh_slots:
+            records = [record async for record in self.sampler.sample(collection, animal, self.pool_size)]
+        pool.records = records
+        pool.loaded_at = time.monotonic()
+
+    def _start_refresh(self, collection, animal: str, pool: SamplePool) -> asyncio.Task:
+        if pool.refresh is None or pool.refresh.done():
+            pool.refresh = asyncio.ensure_future(self._load(collection, animal, pool))
+            pool.refresh.add_done_callback(lambda task: self._refresh_done(animal, task))
+        return pool.refresh
+
+    @staticmethod
+    def _refresh_done(animal: str, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Refreshing sample pool for '{animal}' failed: {task.exception()}")
+
+    async def draw(self, collection, animal: str, size: int) -> List[dict]:
+        pool = self._pools.get(animal)
+        if pool is None:
+            pool = self._pools[animal] = SamplePool()
+
+        if not pool.loaded_at:
+            self.misses += 1
+            await asyncio.shield(self._start_refresh(collection, animal, pool))
+        else:
+            self.hits += 1
+            if pool.stale or time.monotonic() - pool.loaded_at > self.ttl:
+                self._start_refresh(collection, animal, pool)
+
+        records = pool.records
+        return random.sample(records, min(size, len(records)))
+
+    def invalidate(self, animal: str):
+        """
+        Mark the pool stale: it keeps serving and the next draw refreshes it in the
+        background, so a burst of changes costs at most one refresh in flight.
+        """
+        if pool := self._pools.get(animal):
+            pool.stale = True
+
+    def discard(self, animal: str):
+        # A refresh already in flight finishes into the detached pool and is discarded
+        self._pools.pop(animal, None)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            animal: {"records": len(pool.records), "age": round(now - pool.loaded_at, 1) if pool.loaded_at else None}
+            for animal, pool in self._pools.items()
+        }
+
+    async def watch(self, database, retry_delay: float = 5.0):
+        """
+        Mark an animal's pool stale when documents are added to or removed from its
+        collection. Updates (e.g. likes) are ignored; the TTL picks those up. Needs a
+        replica set; on a standalone server the watcher logs once and stops.
+        """
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "delete", "replace", "drop", "rename"]}}}]
+        while True:
+            try:
+                async with database.watch(pipeline) as stream:
+                    async for change in stream:
+                        if collection := change.get("ns", {}).get("coll"):
+                            self.invalidate(collection)
+            except OperationFailure as e:
+                if e.code in (40573, 40324):
+                    logger.warning(f"Change streams unavailable, pool invalidation disabled: {e}")
+                    return
+                logger.warning(f"Change stream failed, retrying: {e}")
+            except PyMongoError as e:
+                logger.warning(f"Change stream failed, retrying: {e}")
+            await asyncio.sleep(retry_delay)
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionRegistry:
+    """
+    Names of the animal collections in the `data` database, loaded at startup and
+    refreshed every `refresh_interval` seconds. Requests for names that are not in
+    the registry are rejected without a round trip to MongoDB. Until the first load
+    succeeds every name is let through, so a slow database at startup does not turn
+    into 404s.
+    """
+
+    def __init__(self, database, refresh_interval: float, on_removed: Optional[Callable[[str], None]] = None):
+        self.database = database
+        self.refresh_interval = refresh_interval
+        self.on_removed = on_removed
+        self.names: Set[str] = set()
+        self.loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    async def refresh(self):
+        names = {name for name in await self.database.list_collection_names() if not name.startswith("system.")}
+        if self.loaded_at and self.on_removed:
+            for name in self.names - names:
+                self.on_removed(name)
+        self.names = names
+        self.loaded_at = time.monotonic()
+
+    def __contains__(self, animal: str) -> bool:
+        if not self.loaded_at or animal in self.names:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def snapshot(self) -> dict:
+        return {
+            "collections": sorted(self.names),
+            "age": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+            "known_collection_hits": self.hits,
+            "unknown_collection_misses": self.misses,
+        }
+
+    async def watch(self, retry_delay: float = 5.0):
+        """Refresh forever; a failed refresh keeps the known names and is retried after `retry_delay`."""
+        delay = self.refresh_interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+                delay = self.refresh_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Refreshing collection registry failed, keeping {len(self.names)} known names: {e!r}")
+                delay = min(retry_delay, self.refresh_interval)
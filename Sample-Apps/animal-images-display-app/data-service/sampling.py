@@ -0,0 +1,160 @@
+import asyncio
+import random
+import time
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+RANDOM_KEY_FIELD = "rand"
+
+
+@lru_cache(maxsize=1024)
+def _project_stage(image_service: str, animal: str) -> dict:
+    return {
+        "$project": {
+            "_id": 0,
+            "id": 1,
+            "color": 1,
+            "image_url": {
+                "$concat": [
+                    image_service, "/", animal, "/", {"$toString": "$id"}
+                ]
+            },
+            "likes": 1,
+            "description": 1,
+            "user": {
+                "name": 1,
+                "location": 1
+            }
+        }
+    }
+
+
+def project_stage(image_service: str, animal: str, extra: Optional[dict] = None) -> dict:
+    """
+    Final projection; image_url is only computed for the documents that were picked.
+    Built once per animal and shared between requests, so it must not be mutated.
+    `extra` adds fields callers need internally, such as pagination keys.
+    """
+    stage = _project_stage(image_service, animal)
+    if extra:
+        return {"$project": {**stage["$project"], **extra}}
+    return stage
+
+
+def pipeline_cache_info() -> dict:
+    return _project_stage.cache_info()._asdict()
+
+
+class SampleStrategy:
+    """
+    `$sample` as the first stage, which lets MongoDB use a random cursor instead of
+    scanning and sorting the collection when the sample is under 5% of it.
+    """
+
+    def __init__(self, image_service: str):
+        self.image_service = image_service
+        self._pipelines: Dict[Tuple[str, int], list] = {}
+
+    def sample(self, collection, animal: str, size: int) -> AsyncIterator[dict]:
+        pipeline = self._pipelines.get((animal, size))
+        if pipeline is None:
+            pipeline = self._pipelines[(animal, size)] = [
+                {"$sample": {"size": size}},
+                project_stage(self.image_service, animal),
+            ]
+        return collection.aggregate(pipeline)
+
+
+class RandomKeyStrategy:
+    """
+    Every document carries a uniformly distributed `rand` field with an index on it.
+    A sample is the next `size` documents after a random point, wrapping around to
+    the start of the key space when the tail is too short. Two index range scans,
+    no collection scan.
+    """
+
+    def __init__(self, image_service: str):
+        self.image_service = image_service
+
+    def _pipeline(self, animal: str, match: dict, size: int) -> list:
+        return [
+            {"$match": {RANDOM_KEY_FIELD: match}},
+            {"$sort": {RANDOM_KEY_FIELD: 1}},
+            {"$limit": size},
+            project_stage(self.image_service, animal),
+        ]
+
+    async def sample(self, collection, animal: str, size: int) -> AsyncIterator[dict]:
+        start = random.random()
+        count = 0
+        async for record in collection.aggregate(self._pipeline(animal, {"$gte": start}, size)):
+            count += 1
+            yield record
+        if count < size:
+            async for record in collection.aggregate(self._pipeline(animal, {"$lt": start}, size - count)):
+                yield record
+
+
+class IdCacheStrategy:
+    """
+    Keeps every `id` of a collection in memory, refreshed after `ttl` seconds, and
+    samples in Python. The database only sees an indexed `$in` lookup. Memory grows
+    with collection size, so this suits collections up to a few million documents.
+    """
+
+    def __init__(self, image_service: str, ttl: float):
+        self.image_service = image_service
+        self.ttl = ttl
+        self._ids: Dict[str, Tuple[float, list]] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    async def _load_ids(self, collection, animal: str) -> list:
+        try:
+            ids = [doc["id"] async for doc in collection.find({}, {"_id": 0, "id": 1}) if "id" in doc]
+            self._ids[animal] = (time.monotonic(), ids)
+            return ids
+        finally:
+            del self._loading[animal]
+
+    async def _cached_ids(self, collection, animal: str) -> list:
+        loaded_at, ids = self._ids.get(animal, (0.0, []))
+        if time.monotonic() - loaded_at <= self.ttl:
+            return ids
+        # Requests arriving while the ids load wait on the same read instead of starting their own
+        load = self._loading.get(animal)
+        if load is None:
+            load = self._loading[animal] = asyncio.ensure_future(self._load_ids(collection, animal))
+        return await asyncio.shield(load)
+
+    async def sample(self, collection, animal: str, size: int) -> AsyncIterator[dict]:
+        ids = await self._cached_ids(collection, animal)
+        picked = random.sample(ids, min(size, len(ids)))
+        pipeline = [
+            {"$match": {"id": {"$in": picked}}},
+            project_stage(self.image_service, animal),
+        ]
+        async for record in collection.aggregate(pipeline):
+            yield record
+
+
+async def ensure_random_keys(collection):
+    """Backfill `rand` on documents that lack it and index it. Requires MongoDB 4.4.2+ for $rand."""
+    await collection.update_many(
+        {RANDOM_KEY_FIELD: {"$exists": False}},
+        [{"$set": {RANDOM_KEY_FIELD: {"$rand": {}}}}],
+    )
+    await collection.create_index(RANDOM_KEY_FIELD)
+
+
+async def ensure_id_index(collection):
+    await collection.create_index("id")
+
+
+def create_strategy(name: str, image_service: str, id_cache_ttl: float):
+    if name == "sample":
+        return SampleStrategy(image_service)
+    if name == "random_key":
+        return RandomKeyStrategy(image_service)
+    if name == "id_cache":
+        return IdCacheStrategy(image_service, id_cache_ttl)
+    raise ValueError(f"Unknown sampling strategy '{name}'")
@@ -0,0 +1,324 @@
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    disk_evictions: int = 0
+
+
+class DiskCache:
+    """
+    Second cache tier: one file per key under `directory`, read back through mmap
+    so hits are served from the page cache. Files survive process restarts and are
+    evicted oldest-mtime first once `max_bytes` is exceeded. An entry's metadata, when
+    known, sits next to it in a `.meta` file so a restart does not have to re-stat it.
+    Writes run on executor threads; the size accounting and eviction share a lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, stats: CacheStats):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = stats
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith((".tmp", ".meta")):
+                yield entry
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = mm[:]
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Disk cache read failed for '{key}': {e}")
+            return None
+
+    def get_meta(self, key: str) -> Optional[Any]:
+        try:
+            with open(f"{self._path(key)}.meta", "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logger.warning(f"Disk cache metadata read failed for '{key}': {e}")
+            return None
+
+    def _write_tmp(self, path: str, data: bytes) -> str:
+        # Unique per thread, so concurrent writes of one key never share a temp file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return tmp_path
+
+    def put(self, key: str, data: bytes, meta: Optional[Any] = None):
+        path = self._path(key)
+        try:
+            if meta is not None:
+                os.replace(self._write_tmp(f"{path}.meta", pickle.dumps(meta)), f"{path}.meta")
+            tmp_path = self._write_tmp(path, data)
+            with self._lock:
+                previous = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                self.size += len(data) - previous
+                self._evict()
+        except OSError as e:
+            logger.warning(f"Disk cache write failed for '{key}': {e}")
+
+    def _evict(self):
+        if self.size <= self.max_bytes:
+            return
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            try:
+                os.remove(f"{entry.path}.meta")
+            except FileNotFoundError:
+                pass
+            self.size -= size
+            self.stats.disk_evictions += 1
+
+
+class CacheFill:
+    """
+    Reservation handed to the request that missed the cache. Chunks are buffered
+    while the object is streamed to its client and published to the cache (and to
+    any coalesced waiters) on commit. Objects larger than `max_item_bytes` stop
+    buffering as soon as they cross the limit.
+    """
+
+    def __init__(self, cache: "ImageCache", key: str):
+        self.cache = cache
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._chunks = []
+        self._size = 0
+        self._oversized = False
+        cache._inflight[key] = self
+
+    def append(self, chunk: bytes):
+        if self._oversized:
+            return
+        self._size += len(chunk)
+        if self._size > self.cache.max_item_bytes:
+            self._oversized = True
+            self._chunks = []
+            return
+        self._chunks.append(chunk)
+
+    def commit(self):
+        data = None if self._oversized else b"".join(self._chunks)
+        self._chunks = []
+        if data is not None:
+            self.cache.store(self.key, data)
+        self._resolve(data)
+
+    def abort(self):
+        self._chunks = []
+        self._resolve(None)
+
+    def _resolve(self, data: Optional[bytes]):
+        if self.cache._inflight.get(self.key) is self:
+            del self.cache._inflight[self.key]
+        if not self.future.done():
+            self.future.set_result(data)
+
+
+class ImageCache:
+    """
+    Byte-bounded in-memory LRU with an optional on-disk second tier.
+
+    Concurrent misses for the same key share a single fetch, so a gallery page
+    requesting the same object several times only goes to MinIO once; metadata
+    lookups are merged the same way.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_item_bytes: int,
+        executor,
+        disk_dir: str = "",
+        disk_max_bytes: int = 0,
+        fill_timeout: float = 10.0,
+        meta_max_entries: int = 10000,
+    ):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.executor = executor
+        self.fill_timeout = fill_timeout
+        self.meta_max_entries = meta_max_entries
+        self.stats = CacheStats()
+        self.size = 0
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: Dict[str, CacheFill] = {}
+        self._meta: "OrderedDict[str, Any]" = OrderedDict()
+        self._meta_inflight: Dict[str, asyncio.Task] = {}
+        self.disk = DiskCache(disk_dir, disk_max_bytes, self.stats) if disk_dir else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._items.get(key)
+        if data is not None:
+            self._items.move_to_end(key)
+            self.stats.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_item_bytes or len(data) > self.max_bytes:
+            return
+        if key in self._items:
+            self.size -= len(self._items.pop(key))
+        self._items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+            self.stats.evictions += 1
+
+    def get_meta(self, key: str) -> Optional[Any]:
+        meta = self._meta.get(key)
+        if meta is not None:
+            self._meta.move_to_end(key)
+        return meta
+
+    def put_meta(self, key: str, meta: Any):
+        self._meta[key] = meta
+        self._meta.move_to_end(key)
+        while len(self._meta) > self.meta_max_entries:
+            self._meta.popitem(last=False)
+
+    async def cached_meta(self, key: str) -> Optional[Any]:
+        """Metadata from memory or the disk tier, without going to the backing store."""
+        meta = self.get_meta(key)
+        if meta is None and self.disk:
+            meta = await asyncio.get_running_loop().run_in_executor(self.executor, self.disk.get_meta, key)
+            if meta is not None:
+                self.put_meta(key, meta)
+        return meta
+
+    async def _load_meta(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            meta = await self.cached_meta(key)
+            if meta is None:
+                meta = await fetch()
+                self.put_meta(key, meta)
+            return meta
+        finally:
+            del self._meta_inflight[key]
+
+    async def get_or_fetch_meta(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached metadata, or the result of `fetch()`, shared by all concurrent callers for `key`."""
+        meta = self.get_meta(key)
+        if meta is not None:
+            return meta
+        pending = self._meta_inflight.get(key)
+        if pending is None:
+            pending = self._meta_inflight[key] = asyncio.ensure_future(self._load_meta(key, fetch))
+        # Shielded so one caller disconnecting does not fail the lookup for the others
+        return await asyncio.shield(pending)
+
+    def store(self, key: str, data: bytes):
+        """Put into memory and write through to the disk tier without blocking the caller."""
+        self.put(key, data)
+        if self.disk and len(data) <= self.max_item_bytes:
+            asyncio.get_running_loop().run_in_executor(self.executor, self.disk.put, key, data, self._meta.get(key))
+
+    async def get_or_reserve(self, key: str) -> Tuple[Optional[bytes], Optional[CacheFill]]:
+        """
+        Return `(data, None)` on a hit. On a miss the first caller gets `(None, fill)` and
+        is expected to fetch the object and commit or abort the fill; concurrent callers
+        wait for it. Waiters get `(None, None)` if the leader failed or the object was too
+        large to cache, and should then fetch it themselves without caching.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data, None
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats.coalesced += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(pending.future), self.fill_timeout), None
+            except asyncio.TimeoutError:
+                # The leader never started or stalled; stop routing new requests to it
+                pending.abort()
+                return None, None
+
+        fill = CacheFill(self, key)
+        if self.disk:
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(self.executor, self.disk.get, key)
+            except BaseException:
+                fill.abort()
+                raise
+            if data is not None:
+                self.stats.disk_hits += 1
+                self.put(key, data)
+                fill._resolve(data)
+                return data, None
+
+        self.stats.misses += 1
+        return None, fill
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        data, fill = await self.get_or_reserve(key)
+        if data is not None:
+            return data
+        try:
+            data = await fetch()
+        except BaseException:
+            if fill:
+                fill.abort()
+            raise
+        if fill:
+            fill.append(data)
+            fill.commit()
+        return data
+
+    def snapshot(self) -> dict:
+        lookups = self.stats.hits + self.stats.disk_hits + self.stats.misses
+        return {
+            **asdict(self.stats),
+            "entries": len(self._items),
+            "meta_entries": len(self._meta),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "disk_bytes": self.disk.size if self.disk else 0,
+            "inflight": len(self._inflight),
+            "hit_ratio": round((self.stats.hits + self.stats.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
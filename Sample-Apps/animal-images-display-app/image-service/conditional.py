@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ImageMeta:
+    etag: str
+    size: int
+    last_modified: datetime
+
+    @property
+    def quoted_etag(self) -> str:
+        return f'"{self.etag}"'
+
+    @property
+    def http_last_modified(self) -> str:
+        return format_datetime(self.last_modified.astimezone(timezone.utc), usegmt=True)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _etags(header: str):
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        yield tag.strip('"')
+
+
+def needs_meta(headers: Mapping[str, str]) -> bool:
+    """Whether the request is conditional or ranged, so the response depends on the metadata."""
+    return any(name in headers for name in ("if-none-match", "if-modified-since", "range"))
+
+
+def is_not_modified(headers: Mapping[str, str], meta: ImageMeta) -> bool:
+    """
+    Evaluate If-None-Match, falling back to If-Modified-Since only when no
+    entity tag was sent (RFC 9110 section 13.2.2).
+    """
+    if if_none_match := headers.get("if-none-match"):
+        return any(tag == "*" or tag == meta.etag for tag in _etags(if_none_match))
+
+    if if_modified_since := headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        return meta.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def parse_range(headers: Mapping[str, str], meta: ImageMeta) -> Optional[Tuple[int, int]]:
+    """
+    Return the inclusive `(start, end)` byte range requested, or None when the whole
+    object should be served. Only single ranges are honoured; multi-range requests
+    and stale If-Range validators fall back to a full response.
+    """
+    range_header = headers.get("range")
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    if if_range := headers.get("if-range"):
+        if if_range.strip('"') != meta.etag and if_range != meta.http_last_modified:
+            return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    first, _, last = spec.partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else meta.size - 1
+        else:
+            suffix = int(last)
+            if suffix == 0:
+                raise RangeNotSatisfiable(range_header)
+            start = max(meta.size - suffix, 0)
+            end = meta.size - 1
+    except ValueError:
+        return None
+
+    if start >= meta.size or start > end:
+        raise RangeNotSatisfiable(range_header)
+    return start, min(end, meta.size - 1)
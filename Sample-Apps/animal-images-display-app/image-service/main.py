@@ -1,58 +1,466 @@
+import os
+import re
+import uuid
 import asyncio
+import logging
+import certifi
+import urllib3
 import uvicorn
 from minio import Minio
-from io import BytesIO
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from dataclasses import replace
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
+from cache import ImageCache, CacheFill
+from conditional import ImageMeta, RangeNotSatisfiable, is_not_modified, needs_meta, parse_range
+from variants import FORMATS, Variant, render_variant
+from executors import InstrumentedThreadPoolExecutor
+from storage import StorageBackend, MinioBackend, S3Backend, FilesystemBackend
+from warmup import warm_cache, read_manifest, manifest_candidates, listing_candidates
+from metrics import register_cache, setup_metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 app=FastAPI()
 
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+setup_metrics(app)
 
 class Config(BaseSettings):
-    minio_endpoint: str
+    storage_backend: str = "minio"
+    storage_root: str = "/data/images"
+    s3_region: str = "us-east-1"
+    minio_endpoint: str = ""
     minio_access_key: str = "minioadmin"
     minio_secret_key: str = "minioadmin"
     minio_secure: bool = False
     port: int = 8000
+    executor_workers: int = 16
+    minio_pool_maxsize: int = 16
+    minio_connect_timeout: float = 3.0
+    minio_read_timeout: float = 10.0
+    minio_retries: int = 3
+    minio_retry_backoff: float = 0.2
+    shed_queue_depth: int = 64
+    shed_retry_after: int = 1
+    cache_max_bytes: int = 32 * 1024 * 1024
+    cache_max_item_bytes: int = 4 * 1024 * 1024
+    cache_dir: str = ""
+    cache_disk_max_bytes: int = 512 * 1024 * 1024
+    cache_fill_timeout: float = 10.0
+    stream_chunk_size: int = 64 * 1024
+    meta_cache_max_entries: int = 10000
+    cache_control: str = "public, max-age=86400, immutable"
+    variant_workers: int = 2
+    variant_widths: List[int] = [160, 320, 480, 640, 960, 1280]
+    variant_default_quality: int = 80
+    batch_max_ids: int = 32
+    batch_concurrency: int = 8
+    warmup_enabled: bool = False
+    warmup_manifest: str = ""
+    warmup_prefix: str = ""
+    warmup_max_bytes: int = 16 * 1024 * 1024
+    warmup_timeout: float = 20.0
+    warmup_concurrency: int = 8
 
 load_dotenv()
 config = Config()
-MINIO_CLIENT = Minio(
-    endpoint=config.minio_endpoint,
-    access_key=config.minio_access_key,
-    secret_key=config.minio_secret_key,
-    secure=config.minio_secure
+BUCKET_NAME = "images"
+IMAGE_ID_PATTERN = re.compile(r"^[\w.-]+$")
+
+executor = InstrumentedThreadPoolExecutor(max_workers=config.executor_workers, thread_name_prefix="storage")
+variant_executor = ProcessPoolExecutor(max_workers=config.variant_workers)
+
+def create_storage() -> StorageBackend:
+    if config.storage_backend == "filesystem":
+        return FilesystemBackend(config.storage_root, executor, config.stream_chunk_size)
+    if not config.minio_endpoint:
+        raise ValueError(f"MINIO_ENDPOINT is required for the '{config.storage_backend}' storage backend")
+
+    if config.storage_backend == "minio":
+        http_client = urllib3.PoolManager(
+            num_pools=1,
+            maxsize=config.minio_pool_maxsize,
+            timeout=urllib3.Timeout(connect=config.minio_connect_timeout, read=config.minio_read_timeout),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=urllib3.Retry(
+                total=config.minio_retries,
+                backoff_factor=config.minio_retry_backoff,
+                status_forcelist=[500, 502, 503, 504],
+            ),
+        )
+        client = Minio(
+            endpoint=config.minio_endpoint,
+            access_key=config.minio_access_key,
+            secret_key=config.minio_secret_key,
+            secure=config.minio_secure,
+            http_client=http_client,
+        )
+        return MinioBackend(client, BUCKET_NAME, executor, config.stream_chunk_size)
+
+    if config.storage_backend == "s3":
+        scheme = "https" if config.minio_secure else "http"
+        return S3Backend(
+            endpoint_url=f"{scheme}://{config.minio_endpoint}",
+            access_key=config.minio_access_key,
+            secret_key=config.minio_secret_key,
+            bucket=BUCKET_NAME,
+            chunk_size=config.stream_chunk_size,
+            region=config.s3_region,
+            max_pool_connections=config.minio_pool_maxsize,
+            connect_timeout=config.minio_connect_timeout,
+            read_timeout=config.minio_read_timeout,
+            retries=config.minio_retries,
+        )
+    raise ValueError(f"Unknown storage backend '{config.storage_backend}'")
+
+STORAGE = create_storage()
+
+IMAGE_CACHE = ImageCache(
+    max_bytes=config.cache_max_bytes,
+    max_item_bytes=config.cache_max_item_bytes,
+    executor=executor,
+    disk_dir=config.cache_dir,
+    disk_max_bytes=config.cache_disk_max_bytes,
+    fill_timeout=config.cache_fill_timeout,
+    meta_max_entries=config.meta_cache_max_entries,
 )
+# Memory and disk hits together, matching hit_ratio on /cache/stats
+register_cache("images", lambda: (IMAGE_CACHE.stats.hits + IMAGE_CACHE.stats.disk_hits, IMAGE_CACHE.stats.misses))
 
-BUCKET_NAME = "images"
+async def fetch_image(image_path: str) -> bytes:
+    return await STORAGE.read(image_path)
 
-executor = ThreadPoolExecutor()
+# Fire-and-forget tasks; the loop only keeps weak references, so hold them until done
+background_tasks = set()
 
-def get_image_from_minio(image_name: str):
+def finish_background(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+def run_in_background(coro, name: str):
+    task = asyncio.ensure_future(coro)
+    task.set_name(name)
+    background_tasks.add(task)
+    task.add_done_callback(finish_background)
+
+async def put_variant(variant_key: str, data: bytes, media_type: str):
     try:
-        return MINIO_CLIENT.get_object(BUCKET_NAME, image_name)
+        await STORAGE.put(variant_key, data, media_type)
     except Exception as e:
-        raise FileNotFoundError(f"Image '{image_name}' not found. Error: {str(e)}")
+        logger.warning(f"Failed to store variant '{variant_key}': {e}")
 
-@app.get("/images/{object}/{image_id}")
-async def get_image(object: str, image_id: str):
+async def stream_image(chunks, fill: Optional[CacheFill]):
+    """
+    Forward storage chunks to the client as they arrive, teeing them into the cache
+    fill when this request owns one. The connection goes back to the pool even if
+    the client disconnects mid-stream.
+    """
+    completed = False
     try:
-        image_path= f"{object}/{image_id}.jpg"
-        
-        response = await asyncio.get_event_loop().run_in_executor(
-            executor, get_image_from_minio, image_path
+        async for chunk in chunks:
+            if fill:
+                fill.append(chunk)
+            yield chunk
+        completed = True
+    finally:
+        if fill and completed:
+            fill.commit()
+        elif fill:
+            fill.abort()
+        await chunks.aclose()
+
+class ImageStreamResponse(StreamingResponse):
+    """
+    Streams stream_image() and releases the storage connection and the cache fill once
+    the response is over, even when the body never started (client gone before the
+    first chunk, failed send); the generator's own cleanup only runs if it was entered.
+    """
+
+    def __init__(self, chunks, fill: Optional[CacheFill], **kwargs):
+        super().__init__(stream_image(chunks, fill), **kwargs)
+        self.chunks = chunks
+        self.fill = fill
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+            if self.fill:
+                # No-op once the fill was committed
+                self.fill.abort()
+            await self.chunks.aclose()
+
+async def get_image_meta(image_path: str) -> ImageMeta:
+    return await IMAGE_CACHE.get_or_fetch_meta(image_path, lambda: STORAGE.stat(image_path))
+
+def validator_headers(meta: ImageMeta) -> dict:
+    return {
+        "ETag": meta.quoted_etag,
+        "Last-Modified": meta.http_last_modified,
+        "Cache-Control": config.cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+async def get_cold_image(image_path: str) -> Response:
+    """
+    Plain GET for an image whose metadata is not cached anywhere. The fill leader takes
+    the validators from its get_object response and caches them before streaming, so a
+    cold miss is one storage round trip and coalesced requests find the meta in memory.
+    """
+    image_data, fill = await IMAGE_CACHE.get_or_reserve(image_path)
+    if image_data is not None:
+        meta = await get_image_meta(image_path)
+        return Response(content=image_data, media_type="image/jpeg", headers=validator_headers(meta))
+
+    try:
+        meta, chunks = await STORAGE.open_with_meta(image_path)
+    except BaseException:
+        if fill:
+            fill.abort()
+        raise
+    IMAGE_CACHE.put_meta(image_path, meta)
+    headers = {**validator_headers(meta), "Content-Length": str(meta.size)}
+    return ImageStreamResponse(chunks, fill, media_type="image/jpeg", headers=headers)
+
+async def get_image_range(image_path: str, meta: ImageMeta, start: int, end: int, headers: dict):
+    headers = {
+        **headers,
+        "Content-Range": f"bytes {start}-{end}/{meta.size}",
+        "Content-Length": str(end - start + 1),
+    }
+    image_data = IMAGE_CACHE.get(image_path)
+    if image_data is not None:
+        return Response(content=image_data[start:end + 1], status_code=206, media_type="image/jpeg", headers=headers)
+
+    chunks = await STORAGE.open(image_path, start, end - start + 1)
+    return ImageStreamResponse(chunks, None, status_code=206, media_type="image/jpeg", headers=headers)
+
+async def shed_load():
+    """Reject new work with 503 while too many MinIO calls are already queued."""
+    if config.shed_queue_depth and executor.queue_depth > config.shed_queue_depth:
+        raise HTTPException(
+            status_code=503,
+            detail="Image service is overloaded, retry later",
+            headers={"Retry-After": str(config.shed_retry_after)},
+        )
+
+def parse_variant(w: Optional[int], q: Optional[int], fmt: Optional[str]) -> Optional[Variant]:
+    if w is None and q is None and fmt is None:
+        return None
+    if w is not None and w not in config.variant_widths:
+        raise HTTPException(status_code=400, detail=f"Unsupported width {w}, expected one of {config.variant_widths}")
+    if q is not None and not 1 <= q <= 100:
+        raise HTTPException(status_code=400, detail="Quality must be between 1 and 100")
+    if fmt is not None and fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}', expected one of {list(FORMATS)}")
+    return Variant(width=w, quality=q or config.variant_default_quality, fmt=fmt or "jpeg")
+
+async def build_variant(image_path: str, variant_key: str, variant: Variant) -> bytes:
+    """
+    Load a previously rendered variant from MinIO, or render it from the original in
+    the process pool and write it back under the variants/ prefix.
+    """
+    try:
+        return await STORAGE.read(variant_key)
+    except FileNotFoundError:
+        pass
+
+    original = await IMAGE_CACHE.get_or_fetch(image_path, lambda: fetch_image(image_path))
+    data = await asyncio.get_event_loop().run_in_executor(variant_executor, render_variant, original, variant)
+    run_in_background(put_variant(variant_key, data, variant.media_type), f"put_variant {variant_key}")
+    return data
+
+async def get_image_variant(object: str, image_id: str, image_path: str, meta: ImageMeta, variant: Variant, request: Request):
+    variant_meta = replace(meta, etag=f"{meta.etag}-{variant.suffix}")
+    headers = validator_headers(variant_meta)
+    if is_not_modified(request.headers, variant_meta):
+        return Response(status_code=304, headers=headers)
+
+    variant_key = variant.key(object, image_id)
+    data = await IMAGE_CACHE.get_or_fetch(variant_key, lambda: build_variant(image_path, variant_key, variant))
+    variant_meta = replace(variant_meta, size=len(data))
+
+    try:
+        byte_range = parse_range(request.headers, variant_meta)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(data)}"})
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(content=data[start:end + 1], status_code=206, media_type=variant.media_type, headers=headers)
+    return Response(content=data, media_type=variant.media_type, headers=headers)
+
+async def load_batch_item(object: str, image_id: str, variant: Optional[Variant], semaphore: asyncio.Semaphore):
+    image_path = f"{object}/{image_id}.jpg"
+    async with semaphore:
+        try:
+            if variant is None:
+                data = await IMAGE_CACHE.get_or_fetch(image_path, lambda: fetch_image(image_path))
+                return image_id, 200, "image/jpeg", data
+            variant_key = variant.key(object, image_id)
+            data = await IMAGE_CACHE.get_or_fetch(variant_key, lambda: build_variant(image_path, variant_key, variant))
+            return image_id, 200, variant.media_type, data
+        except FileNotFoundError:
+            return image_id, 404, "text/plain", b""
+        except Exception as e:
+            logger.warning(f"Batch fetch of '{image_path}' failed: {e}")
+            return image_id, 500, "text/plain", b""
+
+async def stream_batch(object: str, image_ids: List[str], variant: Optional[Variant], boundary: str):
+    """
+    Emit one multipart/mixed part per image as soon as its fetch completes, so the
+    slowest object does not hold back the rest of the page.
+    """
+    semaphore = asyncio.Semaphore(config.batch_concurrency)
+    tasks = [asyncio.ensure_future(load_batch_item(object, image_id, variant, semaphore)) for image_id in image_ids]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            image_id, status, media_type, data = await next_done
+            yield (
+                f"--{boundary}\r\n"
+                f"Content-Type: {media_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"X-Image-Id: {image_id}\r\n"
+                f"X-Status: {status}\r\n\r\n"
+            ).encode() + data + b"\r\n"
+        yield f"--{boundary}--\r\n".encode()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+warmup_done = asyncio.Event()
+
+async def run_warmup():
+    try:
+        if config.warmup_manifest:
+            candidates = manifest_candidates(read_manifest(config.warmup_manifest))
+        else:
+            candidates = listing_candidates(STORAGE, config.warmup_prefix)
+        result = await warm_cache(
+            IMAGE_CACHE,
+            STORAGE,
+            candidates,
+            max_bytes=config.warmup_max_bytes,
+            timeout=config.warmup_timeout,
+            concurrency=config.warmup_concurrency,
         )
+        logger.info(
+            f"Cache warm-up loaded {result.objects} objects ({result.bytes} bytes) in {result.seconds:.2f}s"
+            f"{' (timed out)' if result.timed_out else ''}, {result.failed} failed"
+        )
+    except Exception as e:
+        logger.warning(f"Cache warm-up failed: {e}")
+    finally:
+        warmup_done.set()
+
+@app.on_event("startup")
+async def start_warmup():
+    if config.warmup_enabled:
+        run_in_background(run_warmup(), "warmup")
+    else:
+        warmup_done.set()
+
+@app.on_event("shutdown")
+async def close_storage():
+    await STORAGE.close()
+
+@app.get("/healthz")
+async def health_check():
+    """Liveness probe - returns 200 if app is running"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe - reports ready once the optional cache warm-up has finished"""
+    if not warmup_done.is_set():
+        raise HTTPException(status_code=503, detail="Cache warm-up in progress")
+    return {"status": "ready"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return IMAGE_CACHE.snapshot()
+
+@app.get("/images/{object}", dependencies=[Depends(shed_load)])
+async def get_images_batch(
+    object: str,
+    ids: List[str] = Query(...),
+    w: Optional[int] = None,
+    q: Optional[int] = None,
+    fmt: Optional[str] = None,
+):
+    """
+    Fetch a whole gallery page in one request, e.g. `/images/cats?ids=1,2,3&w=320`.
+    Missing images are returned as parts with `X-Status: 404` rather than failing the batch.
+    """
+    variant = parse_variant(w, q, fmt)
+    image_ids = list(dict.fromkeys(image_id for value in ids for image_id in value.split(",") if image_id))
+    if not image_ids or len(image_ids) > config.batch_max_ids:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {config.batch_max_ids} ids are allowed")
+    if invalid := [image_id for image_id in image_ids if not IMAGE_ID_PATTERN.match(image_id)]:
+        raise HTTPException(status_code=400, detail=f"Invalid image ids: {invalid}")
+
+    boundary = uuid.uuid4().hex
+    return StreamingResponse(
+        stream_batch(object, image_ids, variant, boundary),
+        media_type=f"multipart/mixed; boundary={boundary}",
+    )
+
+@app.get("/images/{object}/{image_id}", dependencies=[Depends(shed_load)])
+async def get_image(
+    object: str,
+    image_id: str,
+    request: Request,
+    w: Optional[int] = None,
+    q: Optional[int] = None,
+    fmt: Optional[str] = None,
+):
+    variant = parse_variant(w, q, fmt)
+    try:
+        image_path= f"{object}/{image_id}.jpg"
+
+        if variant is not None:
+            meta = await get_image_meta(image_path)
+            return await get_image_variant(object, image_id, image_path, meta, variant, request)
+
+        meta = await IMAGE_CACHE.cached_meta(image_path)
+        if meta is None and not needs_meta(request.headers):
+            return await get_cold_image(image_path)
+        if meta is None:
+            meta = await get_image_meta(image_path)
+
+        headers = validator_headers(meta)
+        if is_not_modified(request.headers, meta):
+            return Response(status_code=304, headers=headers)
+
+        try:
+            byte_range = parse_range(request.headers, meta)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{meta.size}"})
+        if byte_range is not None:
+            return await get_image_range(image_path, meta, *byte_range, headers)
+
+        image_data, fill = await IMAGE_CACHE.get_or_reserve(image_path)
+        if image_data is not None:
+            return Response(content=image_data, media_type="image/jpeg", headers=headers)
 
-        image_data = BytesIO(await asyncio.get_event_loop().run_in_executor(executor, response.read))
-        response.close()
-        response.release_conn()
+        try:
+            chunks = await STORAGE.open(image_path)
+        except BaseException:
+            if fill:
+                fill.abort()
+            raise
 
-        return StreamingResponse(image_data, media_type="image/jpeg")
+        headers["Content-Length"] = str(meta.size)
+        return ImageStreamResponse(chunks, fill, media_type="image/jpeg", headers=headers)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
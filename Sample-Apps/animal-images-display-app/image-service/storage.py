@@ -0,0 +1,381 @@
+import asyncio
+import inspect
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+from typing import Any, AsyncIterator, Callable, Tuple
+
+from conditional import ImageMeta
+from metrics import observe_downstream
+
+
+class ChunkStream:
+    """
+    Async iterator over an opened object. `release` (the connection or file cleanup,
+    sync or async) runs on exhaustion or aclose(), including an aclose() before the
+    first chunk, which an async generator's finally block would never see.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], release: Callable[[], Any]):
+        self._chunks = chunks
+        self._release = release
+        self._released = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        try:
+            return await self._chunks.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        if self._released:
+            return
+        self._released = True
+        await self._chunks.aclose()
+        result = self._release()
+        if inspect.isawaitable(result):
+            await result
+
+
+class StorageBackend(ABC):
+    """
+    Object store the image service reads from. Every method raises FileNotFoundError
+    when the object does not exist or cannot be fetched.
+    """
+
+    @abstractmethod
+    async def stat(self, name: str) -> ImageMeta:
+        ...
+
+    @abstractmethod
+    async def read(self, name: str) -> bytes:
+        ...
+
+    @abstractmethod
+    async def open(self, name: str, offset: int = 0, length: int = 0) -> ChunkStream:
+        """
+        Start fetching an object and return a ChunkStream over its chunks. Errors are
+        raised here, before the first chunk, so callers can still answer 404. The
+        stream releases the underlying connection when exhausted or closed.
+        """
+
+    async def open_with_meta(self, name: str) -> Tuple[ImageMeta, ChunkStream]:
+        """
+        `open()` the whole object and return its metadata alongside the chunks. Backends
+        that get size, ETag and Last-Modified with the object override this to save the
+        separate stat round trip.
+        """
+        meta = await self.stat(name)
+        return meta, await self.open(name)
+
+    @abstractmethod
+    async def put(self, name: str, data: bytes, content_type: str):
+        ...
+
+    @abstractmethod
+    def list_objects(self, prefix: str = "") -> AsyncIterator[Tuple[str, ImageMeta]]:
+        """Iterate over `(name, meta)` for every object under `prefix`."""
+
+    async def close(self):
+        pass
+
+
+class MinioBackend(StorageBackend):
+    """Blocking MinIO SDK calls, pushed onto a thread pool."""
+
+    def __init__(self, client, bucket: str, executor, chunk_size: int):
+        self.client = client
+        self.bucket = bucket
+        self.executor = executor
+        self.chunk_size = chunk_size
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, fn, *args)
+
+    def _get_object(self, name: str, offset: int = 0, length: int = 0):
+        try:
+            with observe_downstream("minio", "get_object"):
+                return self.client.get_object(self.bucket, name, offset=offset, length=length)
+        except Exception as e:
+            raise FileNotFoundError(f"Image '{name}' not found. Error: {str(e)}")
+
+    @staticmethod
+    def _release(response):
+        response.close()
+        response.release_conn()
+
+    def _stat(self, name: str) -> ImageMeta:
+        try:
+            with observe_downstream("minio", "stat_object"):
+                stat = self.client.stat_object(self.bucket, name)
+        except Exception as e:
+            raise FileNotFoundError(f"Image '{name}' not found. Error: {str(e)}")
+        return ImageMeta(etag=stat.etag, size=stat.size, last_modified=stat.last_modified)
+
+    def _read(self, name: str) -> bytes:
+        response = self._get_object(name)
+        try:
+            return response.read()
+        finally:
+            self._release(response)
+
+    def _put(self, name: str, data: bytes, content_type: str):
+        with observe_downstream("minio", "put_object"):
+            self.client.put_object(self.bucket, name, BytesIO(data), len(data), content_type=content_type)
+
+    async def stat(self, name: str) -> ImageMeta:
+        return await self._run(self._stat, name)
+
+    async def read(self, name: str) -> bytes:
+        return await self._run(self._read, name)
+
+    async def open(self, name: str, offset: int = 0, length: int = 0) -> ChunkStream:
+        response = await self._run(self._get_object, name, offset, length)
+        return self._stream(response)
+
+    async def open_with_meta(self, name: str) -> Tuple[ImageMeta, ChunkStream]:
+        response = await self._run(self._get_object, name)
+        headers = response.headers
+        try:
+            meta = ImageMeta(
+                etag=headers["ETag"].strip('"'),
+                size=int(headers["Content-Length"]),
+                last_modified=parsedate_to_datetime(headers["Last-Modified"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            await self._run(self._release, response)
+            raise
+        return meta, self._stream(response)
+
+    def _stream(self, response) -> ChunkStream:
+        return ChunkStream(self._iter_chunks(response), lambda: self._run(self._release, response))
+
+    async def _iter_chunks(self, response) -> AsyncIterator[bytes]:
+        chunks = response.stream(self.chunk_size)
+        while True:
+            chunk = await self._run(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+
+    async def put(self, name: str, data: bytes, content_type: str):
+        await self._run(self._put, name, data, content_type)
+
+    async def list_objects(self, prefix: str = "") -> AsyncIterator[Tuple[str, ImageMeta]]:
+        objects = await self._run(lambda: self.client.list_objects(self.bucket, prefix=prefix or None, recursive=True))
+        while True:
+            obj = await self._run(next, objects, None)
+            if obj is None:
+                break
+            if obj.is_dir:
+                continue
+            yield obj.object_name, ImageMeta(etag=obj.etag.strip('"'), size=obj.size, last_modified=obj.last_modified)
+
+
+class S3Backend(StorageBackend):
+    """
+    Native asyncio S3 client (aiobotocore), so object reads never touch the thread
+    pool. Works against MinIO or any other S3-compatible endpoint.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        access_key: str,
+        secret_key: str,
+        bucket: str,
+        chunk_size: int,
+        region: str = "us-east-1",
+        max_pool_connections: int = 10,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        retries: int = 3,
+    ):
+        from aiobotocore.config import AioConfig
+        from aiobotocore.session import get_session
+
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self._client_context = get_session().create_client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region,
+            config=AioConfig(
+                max_pool_connections=max_pool_connections,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                retries={"max_attempts": retries, "mode": "standard"},
+                s3={"addressing_style": "path"},
+            ),
+        )
+        self._client = None
+        self._client_lock = asyncio.Lock()
+
+    async def _get_client(self):
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client = await self._client_context.__aenter__()
+        return self._client
+
+    async def _get_object(self, name: str, **kwargs):
+        client = await self._get_client()
+        try:
+            with observe_downstream("s3", "get_object"):
+                return await client.get_object(Bucket=self.bucket, Key=name, **kwargs)
+        except Exception as e:
+            raise FileNotFoundError(f"Image '{name}' not found. Error: {str(e)}")
+
+    async def stat(self, name: str) -> ImageMeta:
+        client = await self._get_client()
+        try:
+            with observe_downstream("s3", "head_object"):
+                head = await client.head_object(Bucket=self.bucket, Key=name)
+        except Exception as e:
+            raise FileNotFoundError(f"Image '{name}' not found. Error: {str(e)}")
+        return ImageMeta(etag=head["ETag"].strip('"'), size=head["ContentLength"], last_modified=head["LastModified"])
+
+    async def read(self, name: str) -> bytes:
+        response = await self._get_object(name)
+        async with response["Body"] as body:
+            return await body.read()
+
+    async def open(self, name: str, offset: int = 0, length: int = 0) -> ChunkStream:
+        kwargs = {}
+        if offset or length:
+            kwargs["Range"] = f"bytes={offset}-{offset + length - 1 if length else ''}"
+        response = await self._get_object(name, **kwargs)
+        return self._stream(response["Body"])
+
+    async def open_with_meta(self, name: str) -> Tuple[ImageMeta, ChunkStream]:
+        response = await self._get_object(name)
+        meta = ImageMeta(
+            etag=response["ETag"].strip('"'),
+            size=response["ContentLength"],
+            last_modified=response["LastModified"],
+        )
+        return meta, self._stream(response["Body"])
+
+    def _stream(self, body) -> ChunkStream:
+        return ChunkStream(self._iter_chunks(body), body.close)
+
+    async def _iter_chunks(self, body) -> AsyncIterator[bytes]:
+        while chunk := await body.read(self.chunk_size):
+            yield chunk
+
+    async def put(self, name: str, data: bytes, content_type: str):
+        client = await self._get_client()
+        with observe_downstream("s3", "put_object"):
+            await client.put_object(Bucket=self.bucket, Key=name, Body=data, ContentType=content_type)
+
+    async def list_objects(self, prefix: str = "") -> AsyncIterator[Tuple[str, ImageMeta]]:
+        client = await self._get_client()
+        paginator = client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"], ImageMeta(etag=obj["ETag"].strip('"'), size=obj["Size"], last_modified=obj["LastModified"])
+
+    async def close(self):
+        if self._client is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client = None
+
+
+class FilesystemBackend(StorageBackend):
+    """Objects stored as plain files under `root`; meant for tests and local runs."""
+
+    def __init__(self, root: str, executor, chunk_size: int):
+        self.root = os.path.realpath(root)
+        self.executor = executor
+        self.chunk_size = chunk_size
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, fn, *args)
+
+    def _path(self, name: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            raise FileNotFoundError(f"Image '{name}' not found. Error: outside storage root")
+        return path
+
+    def _stat(self, name: str) -> ImageMeta:
+        try:
+            stat = os.stat(self._path(name))
+        except OSError as e:
+            raise FileNotFoundError(f"Image '{name}' not found. Error: {str(e)}")
+        return ImageMeta(
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            size=stat.st_size,
+            last_modified=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        )
+
+    def _read(self, name: str) -> bytes:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except OSError as e:
+            raise FileNotFoundError(f"Image '{name}' not found. Error: {str(e)}")
+
+    def _open(self, name: str, offset: int):
+        try:
+            f = open(self._path(name), "rb")
+        except OSError as e:
+            raise FileNotFoundError(f"Image '{name}' not found. Error: {str(e)}")
+        f.seek(offset)
+        return f
+
+    def _put(self, name: str, data: bytes):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def stat(self, name: str) -> ImageMeta:
+        return await self._run(self._stat, name)
+
+    async def read(self, name: str) -> bytes:
+        return await self._run(self._read, name)
+
+    async def open(self, name: str, offset: int = 0, length: int = 0) -> ChunkStream:
+        f = await self._run(self._open, name, offset)
+        return ChunkStream(self._iter_chunks(f, length), f.close)
+
+    async def _iter_chunks(self, f, length: int) -> AsyncIterator[bytes]:
+        remaining = length or None
+        while remaining is None or remaining > 0:
+            size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+            chunk = await self._run(f.read, size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+    async def put(self, name: str, data: bytes, content_type: str):
+        await self._run(self._put, name, data)
+
+    def _list_names(self, prefix: str):
+        names = []
+        for directory, _, files in os.walk(self.root):
+            for file_name in files:
+                name = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, "/")
+                if name.startswith(prefix) and not name.endswith(".tmp"):
+                    names.append(name)
+        return sorted(names)
+
+    async def list_objects(self, prefix: str = "") -> AsyncIterator[Tuple[str, ImageMeta]]:
+        for name in await self._run(self._list_names, prefix):
+            try:
+                yield name, await self.stat(name)
+            except FileNotFoundError:
+                continue
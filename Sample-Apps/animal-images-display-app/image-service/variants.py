@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+
+VARIANT_PREFIX = "variants"
+
+
+@dataclass(frozen=True)
+class Variant:
+    width: Optional[int]
+    quality: int
+    fmt: str
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.fmt][1]
+
+    @property
+    def suffix(self) -> str:
+        return f"w{self.width or 0}-q{self.quality}.{self.fmt}"
+
+    def key(self, object: str, image_id: str) -> str:
+        return f"{VARIANT_PREFIX}/{object}/{image_id}/{self.suffix}"
+
+
+def render_variant(data: bytes, variant: Variant) -> bytes:
+    """
+    Resize and re-encode an image. Runs in the process pool, so it must stay a
+    module-level function with picklable arguments.
+    """
+    with Image.open(BytesIO(data)) as image:
+        if variant.width and image.width > variant.width:
+            height = max(1, round(image.height * variant.width / image.width))
+            image = image.resize((variant.width, height), Image.Resampling.LANCZOS)
+        if variant.fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        output = BytesIO()
+        image_format = FORMATS[variant.fmt][0]
+        if image_format == "PNG":
+            image.save(output, format=image_format, optimize=True)
+        else:
+            image.save(output, format=image_format, quality=variant.quality)
+        return output.getvalue()
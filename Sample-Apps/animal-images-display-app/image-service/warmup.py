@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Tuple
+
+from cache import ImageCache
+from conditional import ImageMeta
+from storage import StorageBackend
+from variants import VARIANT_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupResult:
+    objects: int = 0
+    bytes: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    timed_out: bool = False
+
+
+def read_manifest(path: str) -> List[str]:
+    """Hot-key manifest: one object name per line, most popular first. `#` starts a comment."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+async def manifest_candidates(names: List[str]) -> AsyncIterator[Tuple[str, Optional[ImageMeta]]]:
+    for name in names:
+        yield name, None
+
+
+async def listing_candidates(storage: StorageBackend, prefix: str) -> AsyncIterator[Tuple[str, Optional[ImageMeta]]]:
+    async for name, meta in storage.list_objects(prefix):
+        if not name.startswith(f"{VARIANT_PREFIX}/"):
+            yield name, meta
+
+
+async def warm_cache(
+    cache: ImageCache,
+    storage: StorageBackend,
+    candidates: AsyncIterator[Tuple[str, Optional[ImageMeta]]],
+    max_bytes: int,
+    timeout: float,
+    concurrency: int,
+) -> WarmupResult:
+    """
+    Load candidates into the cache until `max_bytes` have been read or `timeout`
+    seconds have passed. Objects whose listed size would overshoot the byte budget
+    are skipped; with unknown sizes the budget may be exceeded by at most
+    `concurrency` objects.
+    """
+    result = WarmupResult()
+    started = time.perf_counter()
+    budget_left = max_bytes
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def load(name: str, meta: Optional[ImageMeta]):
+        try:
+            if meta is None:
+                meta = await storage.stat(name)
+            cache.put_meta(name, meta)
+            data = await cache.get_or_fetch(name, lambda: storage.read(name))
+            result.objects += 1
+            result.bytes += len(data)
+        except FileNotFoundError as e:
+            result.failed += 1
+            logger.warning(f"Warm-up skipped '{name}': {e}")
+        finally:
+            semaphore.release()
+
+    async def schedule():
+        nonlocal budget_left
+        async for name, meta in candidates:
+            if budget_left <= 0:
+                break
+            if meta is not None:
+                if meta.size > cache.max_item_bytes or meta.size > budget_left:
+                    continue
+                budget_left -= meta.size
+            await semaphore.acquire()
+            if meta is None:
+                budget_left = max_bytes - result.bytes
+            task = asyncio.ensure_future(load(name, meta))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    try:
+        await asyncio.wait_for(schedule(), timeout)
+    except asyncio.TimeoutError:
+        result.timed_out = True
+        for task in list(tasks):
+            task.cancel()
+
+    result.seconds = time.perf_counter() - started
+    return result
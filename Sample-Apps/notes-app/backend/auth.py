@@ -1,3 +1,6 @@
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -5,15 +8,48 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from database import db
+from cache import TTLCache
+from metrics import observe_downstream, register_cache
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cost factor for new hashes; existing hashes keep the cost they were created with
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so threads keep the event loop responsive as long as a core
+# is left for it. "process" workers also run at a lower CPU priority (HASH_NICE), which
+# keeps request latency flat even on a single-core pod.
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 1) - 1))))
+HASH_NICE = int(os.getenv("HASH_NICE", "10"))
+# Hashing requests allowed to wait for a worker before new ones get a 503
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+HASH_RETRY_AFTER = os.getenv("HASH_RETRY_AFTER", "1")
+
+# User records are cached per `sub` for USER_CACHE_TTL seconds; decoded tokens until they expire
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Trust the signed claims and skip the user lookup entirely; a deleted user's tokens
+# then stay valid until they expire
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() == "true"
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+if HASH_EXECUTOR == "process":
+    hash_executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, initializer=os.nice, initargs=(HASH_NICE,))
+else:
+    hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+hash_pending = 0
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+token_cache = TTLCache(TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+register_cache("auth_users", lambda: (user_cache.hits, user_cache.misses))
+register_cache("auth_tokens", lambda: (token_cache.hits, token_cache.misses))
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -23,6 +59,36 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def run_hashing(fn, *args):
+    """
+    Run a bcrypt call on the hash pool so the event loop keeps serving other requests.
+    Once every worker is busy and HASH_QUEUE_LIMIT calls are waiting, further calls
+    are rejected with 503 instead of queueing without bound.
+    """
+    global hash_pending
+    if hash_pending >= HASH_WORKERS + HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, try again shortly",
+            headers={"Retry-After": HASH_RETRY_AFTER},
+        )
+    hash_pending += 1
+    try:
+        # Includes time spent queued for a worker, which is what logins actually wait
+        with observe_downstream("bcrypt", fn.__name__):
+            return await asyncio.get_event_loop().run_in_executor(hash_executor, fn, *args)
+    finally:
+        hash_pending -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_hashing(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await run_hashing(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
@@ -30,21 +96,45 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def invalidate_user(username: str):
+    """Call whenever a user record changes or is removed."""
+    user_cache.pop(username)
+
+
+def invalidate_token(token: str):
+    token_cache.pop(_token_key(token))
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    token_key = _token_key(token)
+    payload = token_cache.get(token_key)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise credentials_exception
-    except JWTError:
+        # Tokens without exp are still cached, but only for the cache's own TTL
+        token_cache.set(token_key, payload, expires_at=payload.get("exp"))
+
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
+    if AUTH_STATELESS:
+        return {"username": username}
 
-    user = await db.users.find_one({"username": username})
+    user = user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await db.users.find_one({"username": username}, {"hashed_password": 0})
+        if user is None:
+            raise credentials_exception
+        user_cache.set(username, user)
     return user
@@ -0,0 +1,126 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+
+# Deleting a note sets `deleted_at` on it instead of removing it, so the delete and the
+# record that sync clients read are one write; a TTL index purges it later. Every read
+# of live notes filters on `deleted_at: None`.
+TOKEN_VERSION = 2
+EPOCH = datetime(1970, 1, 1)
+
+# A sync position: (timestamp, _id) of the last change the client has seen
+Position = Tuple[datetime, Optional[ObjectId]]
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class ExpiredToken(ValueError):
+    pass
+
+
+def encode_token(updated: Position, deleted: Position) -> str:
+    state = {"v": TOKEN_VERSION, "u": list(updated), "d": list(deleted)}
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode()).decode().rstrip("=")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # json_util hands datetimes back timezone-aware; stored values are naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def decode_token(token: str) -> Tuple[Position, Position]:
+    try:
+        state = json_util.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        updated = (_naive_utc(state["u"][0]), state["u"][1])
+        deleted = (_naive_utc(state["d"][0]), state["d"][1])
+    except (binascii.Error, ValueError, TypeError, KeyError, IndexError, AttributeError) as e:
+        raise InvalidToken(f"Malformed sync token: {e}")
+    if state.get("v") != TOKEN_VERSION:
+        # Older tokens point into the retired note_tombstones collection
+        raise ExpiredToken("Sync token is from an older server version, resync from scratch")
+    return updated, deleted
+
+
+def _after(field: str, position: Position) -> dict:
+    timestamp, last_id = position
+    if last_id is None:
+        return {field: {"$gte": timestamp}}
+    return {"$or": [{field: {"$gt": timestamp}}, {field: timestamp, "_id": {"$gt": last_id}}]}
+
+
+async def fetch_changes(
+    db,
+    username: str,
+    since: Optional[str],
+    limit: int,
+    overlap: timedelta,
+    tombstone_ttl: timedelta,
+) -> Tuple[List[dict], List[dict], str, bool]:
+    """
+    Notes created or updated, and notes deleted, after the `since` token; with no token
+    the whole library. Returns (changed, deleted, next_token, has_more).
+    """
+    if since:
+        updated_position, deleted_position = decode_token(since)
+        if deleted_position[0] < datetime.utcnow() - tombstone_ttl:
+            raise ExpiredToken("Sync token is older than the tombstone retention, resync from scratch")
+    else:
+        updated_position = deleted_position = (EPOCH, None)
+
+    changed = await db.notes.find(
+        {"username": username, "deleted_at": None, **_after("updated_at", updated_position)}
+    ).sort([("updated_at", 1), ("_id", 1)]).limit(limit + 1).to_list(None)
+    deleted = await db.notes.find(
+        {"username": username, **_after("deleted_at", deleted_position)}, {"deleted_at": 1}
+    ).sort([("deleted_at", 1), ("_id", 1)]).limit(limit + 1).to_list(None)
+
+    # Once a stream is caught up its position moves to `overlap` before now. updated_at
+    # is stamped before the write commits, so a write can become visible after a later
+    # timestamp was read; re-sending the last few seconds covers that, and clients apply
+    # changes idempotently. It also keeps idle positions fresh for the expiry check.
+    caught_up = (datetime.utcnow() - overlap, None)
+    if len(changed) > limit:
+        changed = changed[:limit]
+        updated_position = (changed[-1]["updated_at"], changed[-1]["_id"])
+    else:
+        updated_position = caught_up
+    if len(deleted) > limit:
+        deleted = deleted[:limit]
+        deleted_position = (deleted[-1]["deleted_at"], deleted[-1]["_id"])
+    else:
+        deleted_position = caught_up
+    has_more = updated_position is not caught_up or deleted_position is not caught_up
+    return changed, deleted, encode_token(updated_position, deleted_position), has_more
+
+
+def soft_delete(now: datetime) -> dict:
+    """Update document that marks a note deleted and drops its content."""
+    return {"$set": {"deleted_at": now}, "$unset": {"title": "", "content": ""}}
+
+
+async def watch_user(db, username: str) -> AsyncIterator[dict]:
+    """
+    Change stream over the user's notes (needs a replica set). Yields
+    `{"type": "upsert", "note": {...}}` or `{"type": "delete", "id": ...}`.
+    """
+    pipeline = [
+        {
+            "$match": {
+                "ns.coll": "notes",
+                "operationType": {"$in": ["insert", "update", "replace"]},
+                "fullDocument.username": username,
+            }
+        }
+    ]
+    async with db.watch(pipeline, full_document="updateLookup") as stream:
+        async for change in stream:
+            document = change["fullDocument"]
+            if document.get("deleted_at") is not None:
+                yield {"type": "delete", "id": str(document["_id"])}
+            else:
+                yield {"type": "upsert", "note": document}
@@ -1,8 +1,82 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+from metrics import MongoCommandMetrics
 import os
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "notesdb")
+# Sync tokens older than this get 410 and must resync. Deleted notes are purged only
+# TOMBSTONE_PURGE_MARGIN_DAYS later, so a token that is still accepted never points
+# past a purged deletion, whatever the clock skew between this host and MongoDB.
+TOMBSTONE_TTL_DAYS = int(os.getenv("TOMBSTONE_TTL_DAYS", "30"))
+TOMBSTONE_PURGE_MARGIN_DAYS = int(os.getenv("TOMBSTONE_PURGE_MARGIN_DAYS", "7"))
 
-client = AsyncIOMotorClient(MONGO_URL)
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[MongoCommandMetrics()])
 db = client[DB_NAME]
+
+# Indexes the routes in main.py rely on; created at startup (idempotent)
+INDEXES = {
+    "users": [([("username", ASCENDING)], {"unique": True})],
+    # _id is the keyset tie-breaker for GET /notes pages, so the sort never runs in memory
+    "notes": [
+        ([("username", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        # Equality prefix on username keeps GET /notes/search inside one user's notes
+        (
+            [("username", ASCENDING), ("title", TEXT), ("content", TEXT)],
+            {"name": "notes_text", "weights": {"title": 3, "content": 1}},
+        ),
+        ([("username", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)], {}),
+        # Soft-deleted notes, for GET /notes/changes; live notes lack deleted_at and never expire
+        ([("username", ASCENDING), ("deleted_at", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("deleted_at", ASCENDING)], {"expireAfterSeconds": (TOMBSTONE_TTL_DAYS + TOMBSTONE_PURGE_MARGIN_DAYS) * 86400}),
+    ],
+}
+
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # IndexOptionsConflict: the TTL changed since the index was built
+                if e.code != 85 or "expireAfterSeconds" not in options:
+                    raise
+                await db.command(
+                    "collMod",
+                    collection,
+                    index={"keyPattern": dict(keys), "expireAfterSeconds": options["expireAfterSeconds"]},
+                )
+
+
+def _plan_stages(plan: dict) -> list:
+    """Flatten an explain() plan tree into its stage names (classic and SBE layouts)."""
+    stages = [plan["stage"]] if "stage" in plan else []
+    children = list(plan.get("inputStages", []))
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            children.append(plan[key])
+    for child in children:
+        stages += _plan_stages(child)
+    return stages
+
+
+async def check_query_plans() -> list:
+    """
+    explain() the hot queries and return a description of every one that scans the
+    collection or sorts in memory. An empty list means all of them use an index.
+    """
+    probe = "__index_self_check__"
+    queries = {
+        "notes by user, newest first": db.notes.find({"username": probe}).sort([("created_at", -1), ("_id", -1)]),
+        "note by id and owner": db.notes.find({"_id": probe, "username": probe}),
+        "user by username": db.users.find({"username": probe}),
+    }
+    problems = []
+    for name, cursor in queries.items():
+        explain = await cursor.explain()
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        if "COLLSCAN" in stages or "SORT" in stages:
+            problems.append(f"{name}: {' <- '.join(stages)}")
+    return problems
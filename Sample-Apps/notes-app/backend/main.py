@@ -1,21 +1,52 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import timedelta, datetime
+import asyncio
 from bson import ObjectId
 from bson.errors import InvalidId
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+import logging
+import os
+from typing import List
 
-from database import db, client
-from models import UserCreate, Token, NoteCreate, NoteUpdate
+from database import db, client, ensure_indexes, check_query_plans, TOMBSTONE_TTL_DAYS
+from models import UserCreate, Token, NoteCreate, NoteUpdate, BulkNotesRequest, BulkNoteOperation
 from auth import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
+    hash_executor,
+    invalidate_user,
+    user_cache,
+    token_cache,
     create_access_token,
     get_current_user,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
+from responses import CompressionMiddleware, FastJSONResponse, dumps
+from metrics import setup_metrics
+from changes import ExpiredToken, InvalidToken, fetch_changes, soft_delete, watch_user
+from search import MemorySearch, highlight, mongo_search, search_terms, snippet
+from pagination import NOTES_SORT, InvalidCursor, after_cursor, decode_cursor, encode_cursor, summary_projection
 
-app = FastAPI(title="Notes App API")
+logger = logging.getLogger(__name__)
+
+INDEX_SELF_CHECK = os.getenv("INDEX_SELF_CHECK", "true").lower() == "true"
+NOTES_MAX_PAGE_SIZE = int(os.getenv("NOTES_MAX_PAGE_SIZE", "200"))
+NOTES_BULK_MAX_OPERATIONS = int(os.getenv("NOTES_BULK_MAX_OPERATIONS", "1000"))
+# "mongo" uses the text index; "memory" is an in-process fallback for local setups without one
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "mongo")
+NOTES_SEARCH_MAX_OFFSET = int(os.getenv("NOTES_SEARCH_MAX_OFFSET", "1000"))
+CHANGES_MAX_PAGE_SIZE = int(os.getenv("CHANGES_MAX_PAGE_SIZE", "500"))
+CHANGES_OVERLAP_SECONDS = float(os.getenv("CHANGES_OVERLAP_SECONDS", "5"))
+# Server-sent events from MongoDB change streams; needs a replica set
+CHANGE_STREAMS_ENABLED = os.getenv("CHANGE_STREAMS_ENABLED", "false").lower() == "true"
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+app = FastAPI(title="Notes App API", default_response_class=FastJSONResponse)
+memory_search = MemorySearch()
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,10 +55,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("BROTLI_QUALITY", "4")),
+)
+setup_metrics(app)
+
+
+# ── Startup ───────────────────────────────────────────────────────────────────
+
+@app.on_event("startup")
+async def provision_indexes():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        # Readiness keeps failing through the query plan self-check until this is fixed
+        logger.error(f"Creating indexes failed: {e}")
+
+
+@app.on_event("shutdown")
+def stop_hash_pool():
+    hash_executor.shutdown(wait=False, cancel_futures=True)
 
 
 # ── Health & Readiness Probes ──────────────────────────────────────────────────
 
+index_check_passed = False
+
 @app.get("/healthz")
 async def health_check():
     """Liveness probe - returns 200 if app is running"""
@@ -36,26 +92,37 @@ async def health_check():
 
 @app.get("/ready")
 async def readiness_check():
-    """Readiness probe - checks database connectivity"""
+    """Readiness probe - checks database connectivity and that hot queries use indexes"""
+    global index_check_passed
     try:
         # Ping the database to verify connectivity
         await client.admin.command('ping')
-        return {"status": "ready", "database": "connected"}
     except Exception as e:
         raise HTTPException(
             status_code=503, 
             detail=f"Database connection failed: {str(e)}"
         )
 
+    # Plans only change when indexes do, so once the check passes it is not repeated
+    if INDEX_SELF_CHECK and not index_check_passed:
+        try:
+            problems = await check_query_plans()
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Query plan check failed: {str(e)}")
+        if problems:
+            raise HTTPException(status_code=503, detail={"unindexed_queries": problems})
+        index_check_passed = True
+    return {"status": "ready", "database": "connected"}
+
 
 def serialize_note(note: dict) -> dict:
-    return {
-        "id": str(note["_id"]),
-        "title": note["title"],
-        "content": note["content"],
-        "created_at": note["created_at"],
-        "updated_at": note["updated_at"],
-    }
+    serialized = {"id": str(note["_id"]), "title": note["title"]}
+    # Summary projections may leave content out
+    if "content" in note:
+        serialized["content"] = note["content"]
+    serialized["created_at"] = note["created_at"]
+    serialized["updated_at"] = note["updated_at"]
+    return serialized
 
 
 # ── Auth ──────────────────────────────────────────────────────────────────────
@@ -71,15 +138,20 @@ async def register(user: UserCreate):
     if existing:
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    hashed = get_password_hash(user.password)
-    await db.users.insert_one({"username": user.username, "hashed_password": hashed})
+    hashed = await get_password_hash_async(user.password)
+    try:
+        await db.users.insert_one({"username": user.username, "hashed_password": hashed})
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration; the unique index caught it
+        raise HTTPException(status_code=400, detail="Username already taken")
+    invalidate_user(user.username)
     return {"message": "Account created successfully"}
 
 
 @app.post("/auth/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await db.users.find_one({"username": form_data.username})
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    if not user or not await verify_password_async(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -92,14 +164,189 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@app.get("/auth/cache/stats")
+async def auth_cache_stats():
+    return {
+        name: {"entries": len(cache), "hits": cache.hits, "misses": cache.misses}
+        for name, cache in (("users", user_cache), ("tokens", token_cache))
+    }
+
+
 # ── Notes ─────────────────────────────────────────────────────────────────────
 
+async def stream_notes(first: dict, cursor):
+    """Legacy response: every note as one JSON array, serialized as it comes off the cursor."""
+    yield b"[" + dumps(serialize_note(first))
+    async for note in cursor:
+        yield b"," + dumps(serialize_note(note))
+    yield b"]"
+
+
+async def stream_notes_page(first: dict, cursor, limit: int):
+    """
+    `{"notes": [...], "next_cursor": ...}`. The cursor was opened with limit + 1, so
+    the extra note only tells us whether another page exists and is not sent.
+    """
+    yield b'{"notes":[' + dumps(serialize_note(first))
+    last, count, has_more = first, 1, False
+    try:
+        async for note in cursor:
+            if count == limit:
+                has_more = True
+                break
+            yield b"," + dumps(serialize_note(note))
+            last, count = note, count + 1
+    finally:
+        await cursor.close()
+    yield b'],"next_cursor":' + dumps(encode_cursor(last) if has_more else None) + b"}"
+
+
 @app.get("/notes")
-async def get_notes(current_user: dict = Depends(get_current_user)):
-    notes = []
-    async for note in db.notes.find({"username": current_user["username"]}).sort("created_at", -1):
-        notes.append(serialize_note(note))
-    return notes
+async def get_notes(
+    limit: int = Query(None, ge=1, le=NOTES_MAX_PAGE_SIZE),
+    cursor: str = None,
+    preview: int = Query(None, ge=0, le=10000),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Without `limit` or `cursor` every note is returned as a plain array. With them the
+    response is one page plus `next_cursor`, to be passed back as `cursor`; it is null
+    on the last page. `preview=N` trims `content` to N characters, `preview=0` omits it.
+    """
+    query = {"username": current_user["username"], "deleted_at": None}
+    paged = limit is not None or cursor is not None
+    if cursor:
+        try:
+            query.update(after_cursor(decode_cursor(cursor)))
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    projection = summary_projection(preview) if preview is not None else None
+    notes = db.notes.find(query, projection).sort(NOTES_SORT)
+    if paged:
+        limit = limit or NOTES_MAX_PAGE_SIZE
+        notes = notes.limit(limit + 1)
+
+    # Pull the first note before responding so database errors still surface as a 500
+    first = await anext(notes, None)
+    if first is None:
+        return {"notes": [], "next_cursor": None} if paged else []
+    if paged:
+        return StreamingResponse(stream_notes_page(first, notes, limit), media_type="application/json")
+    return StreamingResponse(stream_notes(first, notes), media_type="application/json")
+
+
+@app.get("/notes/changes")
+async def get_changes(
+    since: str = None,
+    limit: int = Query(None, ge=1, le=CHANGES_MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Delta sync. Returns notes created or updated and ids of notes deleted since the
+    `since` token, plus `next_token` for the following call; without `since` the whole
+    library is returned. Keep calling while `has_more` is true. 410 means the token is
+    older than the deleted-note retention (or from an older server) and the client has to start over.
+    """
+    try:
+        changed, deleted, next_token, has_more = await fetch_changes(
+            db,
+            current_user["username"],
+            since,
+            limit or CHANGES_MAX_PAGE_SIZE,
+            timedelta(seconds=CHANGES_OVERLAP_SECONDS),
+            timedelta(days=TOMBSTONE_TTL_DAYS),
+        )
+    except InvalidToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExpiredToken as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return FastJSONResponse({
+        "changed": [serialize_note(note) for note in changed],
+        "deleted": [str(note["_id"]) for note in deleted],
+        "next_token": next_token,
+        "has_more": has_more,
+    })
+
+
+async def stream_change_events(username: str):
+    changes = watch_user(db, username)
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(changes))
+            done, _ = await asyncio.wait({pending}, timeout=SSE_KEEPALIVE_SECONDS)
+            if not done:
+                yield b": keep-alive\n\n"
+                continue
+            try:
+                change = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            if change["type"] == "upsert":
+                data = dumps({"type": "upsert", "note": serialize_note(change["note"])})
+            else:
+                data = dumps(change)
+            yield b"event: " + change["type"].encode() + b"\ndata: " + data + b"\n\n"
+    except PyMongoError as e:
+        logger.warning(f"Change stream for '{username}' ended: {e}")
+        yield b"event: error\ndata: " + dumps({"detail": "Change stream unavailable, fall back to polling"}) + b"\n\n"
+    finally:
+        if pending is not None:
+            pending.cancel()
+            # The change stream generator keeps running inside the task until the
+            # cancellation lands, and aclose() refuses a running generator
+            await asyncio.wait({pending})
+            if not pending.cancelled():
+                pending.exception()  # retrieved so it is not logged as unhandled
+        await changes.aclose()
+
+
+@app.get("/notes/changes/stream")
+async def stream_changes(current_user: dict = Depends(get_current_user)):
+    """Server-sent events for the user's note changes, as an alternative to polling /notes/changes."""
+    if not CHANGE_STREAMS_ENABLED:
+        raise HTTPException(status_code=404, detail="Change streams are disabled")
+    return StreamingResponse(
+        stream_change_events(current_user["username"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/notes/search")
+async def search_notes(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=NOTES_SEARCH_MAX_OFFSET),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Best matches first among the current user's notes. Each result carries an HTML
+    `snippet` of the content and a `title_highlighted`, with matches wrapped in <mark>.
+    `next_offset` is null on the last page.
+    """
+    username = current_user["username"]
+    search = memory_search.search if SEARCH_BACKEND == "memory" else mongo_search
+    matches = await search(db.notes, username, q, offset, limit + 1)
+
+    terms = search_terms(q)
+    results = [
+        {
+            "id": str(note["_id"]),
+            "title": note["title"],
+            "title_highlighted": highlight(note["title"], terms),
+            "snippet": snippet(note.get("content", ""), terms),
+            "score": round(score, 4),
+            "created_at": note["created_at"],
+            "updated_at": note["updated_at"],
+        }
+        for note, score in matches[:limit]
+    ]
+    has_more = len(matches) > limit and offset + limit <= NOTES_SEARCH_MAX_OFFSET
+    return FastJSONResponse({"results": results, "next_offset": offset + limit if has_more else None})
 
 
 @app.post("/notes", status_code=201)
@@ -113,10 +360,127 @@ async def create_note(note: NoteCreate, current_user: dict = Depends(get_current
         "updated_at": now,
     }
     result = await db.notes.insert_one(doc)
+    memory_search.invalidate(current_user["username"])
     doc["_id"] = result.inserted_id
     return serialize_note(doc)
 
 
+def bulk_item_error(operation: BulkNoteOperation, owned: set, targeted: set) -> str:
+    """Validation for one bulk item; returns an error message or an empty string."""
+    if operation.op == "create":
+        if operation.title is None or operation.content is None:
+            return "create requires title and content"
+        return ""
+    if operation.id is None or not ObjectId.is_valid(operation.id):
+        return "Invalid note ID"
+    if ObjectId(operation.id) not in owned:
+        return "Note not found"
+    if ObjectId(operation.id) in targeted:
+        # A second op on the same note would see the first one's write, which bulk_write
+        # gives no per-op result for
+        return "Note is targeted more than once in this batch"
+    targeted.add(ObjectId(operation.id))
+    return ""
+
+
+async def bulk_unmatched(username: str, operations: List[BulkNoteOperation], indexes: List[int], now: datetime) -> set:
+    """
+    Indexes of the update and delete items whose write matched nothing, e.g. because
+    another request deleted the note after the ownership check. Every item stamps `now`
+    on the field it writes, so the stamps still present tell which writes landed.
+    """
+    items = {ObjectId(operations[i].id): i for i in indexes}
+    landed = set()
+    async for note in db.notes.find({"_id": {"$in": list(items)}, "username": username}, {"updated_at": 1, "deleted_at": 1}):
+        i = items[note["_id"]]
+        if note.get("deleted_at" if operations[i].op == "delete" else "updated_at") == now:
+            landed.add(i)
+    return set(indexes) - landed
+
+
+@app.post("/notes/bulk")
+async def bulk_notes(request: BulkNotesRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Apply a batch of create/update/delete operations with a single bulk_write. Returns
+    one result per operation, in request order: `ok`, `error` with a message,
+    `not_found` when an update or delete matched nothing at write time, or `skipped`
+    when an ordered batch stopped at an earlier error. Update and delete targets are
+    checked for existence and ownership with one query beforehand, and each note may
+    be targeted once per batch.
+    """
+    if len(request.operations) > NOTES_BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {NOTES_BULK_MAX_OPERATIONS} operations per request")
+
+    username = current_user["username"]
+    target_ids = [ObjectId(op.id) for op in request.operations if op.op != "create" and op.id and ObjectId.is_valid(op.id)]
+    owned = set()
+    if target_ids:
+        async for note in db.notes.find({"_id": {"$in": target_ids}, "username": username, "deleted_at": None}, {"_id": 1}):
+            owned.add(note["_id"])
+
+    now = datetime.utcnow()
+    # Truncated to the stored millisecond precision so bulk_unmatched can compare stamps
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    results = [{"index": i, "op": op.op, "status": "skipped"} for i, op in enumerate(request.operations)]
+    requests, request_indexes, created, targeted = [], [], {}, set()
+    for i, operation in enumerate(request.operations):
+        error = bulk_item_error(operation, owned, targeted)
+        if error:
+            results[i].update(status="error", error=error)
+            if request.ordered:
+                break
+            continue
+
+        if operation.op == "create":
+            doc = {
+                "_id": ObjectId(),
+                "username": username,
+                "title": operation.title,
+                "content": operation.content,
+                "created_at": now,
+                "updated_at": now,
+            }
+            created[i] = doc
+            requests.append(InsertOne(doc))
+        else:
+            live = {"_id": ObjectId(operation.id), "username": username, "deleted_at": None}
+            if operation.op == "update":
+                update_data: dict = {"updated_at": now}
+                if operation.title is not None:
+                    update_data["title"] = operation.title
+                if operation.content is not None:
+                    update_data["content"] = operation.content
+                requests.append(UpdateOne(live, {"$set": update_data}))
+            else:
+                requests.append(UpdateOne(live, soft_delete(now)))
+        request_indexes.append(i)
+
+    executed, matched = len(requests), 0
+    if requests:
+        try:
+            matched = (await db.notes.bulk_write(requests, ordered=request.ordered)).matched_count
+        except BulkWriteError as e:
+            matched = e.details.get("nMatched", 0)
+            write_errors = e.details.get("writeErrors", [])
+            for write_error in write_errors:
+                results[request_indexes[write_error["index"]]].update(status="error", error=write_error["errmsg"])
+            if request.ordered and write_errors:
+                executed = write_errors[0]["index"]
+        memory_search.invalidate(username)
+
+    applied = [i for position, i in enumerate(request_indexes) if position < executed and results[i]["status"] == "skipped"]
+    targets = [i for i in applied if i not in created]
+    # The counts only say whether something was missed; find out which items only then
+    unmatched = await bulk_unmatched(username, request.operations, targets, now) if matched < len(targets) else set()
+    for i in applied:
+        results[i]["status"] = "not_found" if i in unmatched else "ok"
+        results[i]["id"] = str(created[i]["_id"]) if i in created else request.operations[i].id
+        if i in created:
+            results[i]["note"] = serialize_note(created[i])
+
+    return {"ordered": request.ordered, "results": results}
+
+
 @app.put("/notes/{note_id}")
 async def update_note(
     note_id: str, note: NoteUpdate, current_user: dict = Depends(get_current_user)
@@ -126,18 +490,21 @@ async def update_note(
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid note ID")
 
-    existing = await db.notes.find_one({"_id": oid, "username": current_user["username"]})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Note not found")
-
     update_data: dict = {"updated_at": datetime.utcnow()}
     if note.title is not None:
         update_data["title"] = note.title
     if note.content is not None:
         update_data["content"] = note.content
 
-    await db.notes.update_one({"_id": oid}, {"$set": update_data})
-    updated = await db.notes.find_one({"_id": oid})
+    # Ownership check, update and re-read in one round trip
+    updated = await db.notes.find_one_and_update(
+        {"_id": oid, "username": current_user["username"], "deleted_at": None},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Note not found")
+    memory_search.invalidate(current_user["username"])
     return serialize_note(updated)
 
 
@@ -148,8 +515,11 @@ async def delete_note(note_id: str, current_user: dict = Depends(get_current_use
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid note ID")
 
-    existing = await db.notes.find_one({"_id": oid, "username": current_user["username"]})
-    if not existing:
+    # Marking the note deleted is also what GET /notes/changes reports, so it is one write
+    result = await db.notes.update_one(
+        {"_id": oid, "username": current_user["username"], "deleted_at": None},
+        soft_delete(datetime.utcnow()),
+    )
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Note not found")
-
-    await db.notes.delete_one({"_id": oid})
+    memory_search.invalidate(current_user["username"])
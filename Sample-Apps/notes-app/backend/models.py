@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -29,3 +29,15 @@ class NoteResponse(BaseModel):
     content: str
     created_at: datetime
     updated_at: datetime
+
+
+class BulkNoteOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[str] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+
+
+class BulkNotesRequest(BaseModel):
+    operations: List[BulkNoteOperation]
+    ordered: bool = True
@@ -0,0 +1,45 @@
+import base64
+import binascii
+from datetime import datetime
+
+from bson import ObjectId, json_util
+
+# Newest first; _id breaks ties between notes created in the same millisecond
+NOTES_SORT = [("created_at", -1), ("_id", -1)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(note: dict) -> str:
+    state = {"c": note["created_at"], "i": note["_id"]}
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        state = json_util.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(state, dict) or not isinstance(state.get("c"), datetime) or not isinstance(state.get("i"), ObjectId):
+        raise InvalidCursor("Malformed cursor")
+    return state
+
+
+def after_cursor(state: dict) -> dict:
+    """Filter for the notes that sort after the cursor position in NOTES_SORT order."""
+    return {
+        "$or": [
+            {"created_at": {"$lt": state["c"]}},
+            {"created_at": state["c"], "_id": {"$lt": state["i"]}},
+        ]
+    }
+
+
+def summary_projection(preview: int) -> dict:
+    """Cut `content` down to `preview` characters in the database, or drop it when 0."""
+    projection = {"title": 1, "created_at": 1, "updated_at": 1}
+    if preview:
+        projection["content"] = {"$substrCP": ["$content", 0, preview]}
+    return projection
@@ -0,0 +1,134 @@
+import html
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+TITLE_WEIGHT = 3
+SNIPPET_CHARS = 160
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in TOKEN_PATTERN.findall(text or "")]
+
+
+def search_terms(query: str) -> List[str]:
+    """Positive terms of a $text-style query; `-word` exclusions are dropped."""
+    words = re.findall(r'-?"[^"]*"|-?\S+', query)
+    terms = []
+    for word in words:
+        if not word.startswith("-"):
+            terms += tokenize(word)
+    return list(dict.fromkeys(terms))
+
+
+def _term_pattern(terms: List[str]) -> Optional[re.Pattern]:
+    if not terms:
+        return None
+    # Prefix match so "running" is highlighted for "run", roughly what text-index stemming matches
+    alternatives = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternatives})\w*", re.IGNORECASE)
+
+
+def highlight(text: str, terms: List[str]) -> str:
+    """HTML-escape `text` and wrap every term match in <mark>."""
+    pattern = _term_pattern(terms)
+    if pattern is None:
+        return html.escape(text)
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+def snippet(text: str, terms: List[str], size: int = SNIPPET_CHARS) -> str:
+    """Highlighted window of `size` characters around the first match in `text`."""
+    text = text or ""
+    pattern = _term_pattern(terms)
+    match = pattern.search(text) if pattern else None
+    start = max(0, match.start() - size // 3) if match else 0
+    end = min(len(text), start + size)
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    return prefix + highlight(text[start:end], terms) + suffix
+
+
+class InvertedIndex:
+    """
+    In-process index over one user's notes, ranked with BM25 and title matches
+    weighted higher. Used when MongoDB text search is unavailable (e.g. mongomock in
+    local tests); it is built from the database on first use and dropped on writes.
+    """
+
+    def __init__(self, notes: List[dict]):
+        self.notes: Dict[object, dict] = {}
+        self.postings: Dict[str, Dict[object, int]] = defaultdict(dict)
+        self.lengths: Dict[object, int] = {}
+        for note in notes:
+            counts = Counter(tokenize(note.get("content", "")))
+            for token in tokenize(note.get("title", "")):
+                counts[token] += TITLE_WEIGHT
+            self.notes[note["_id"]] = note
+            self.lengths[note["_id"]] = sum(counts.values())
+            for token, count in counts.items():
+                self.postings[token][note["_id"]] = count
+        self.average_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0.0
+
+    def _matching(self, term: str) -> List[Tuple[object, int]]:
+        # Prefix matching on the query term, like the snippet highlighter
+        matches: Dict[object, int] = defaultdict(int)
+        for token, postings in self.postings.items():
+            if token.startswith(term):
+                for note_id, count in postings.items():
+                    matches[note_id] += count
+        return list(matches.items())
+
+    def search(self, terms: List[str], k1: float = 1.2, b: float = 0.75) -> List[Tuple[dict, float]]:
+        scores: Dict[object, float] = defaultdict(float)
+        total = len(self.notes)
+        for term in terms:
+            matches = self._matching(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (total - len(matches) + 0.5) / (len(matches) + 0.5))
+            for note_id, count in matches:
+                norm = 1 - b + b * self.lengths[note_id] / (self.average_length or 1)
+                scores[note_id] += idf * count * (k1 + 1) / (count + k1 * norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+        return [(self.notes[note_id], score) for note_id, score in ranked]
+
+
+class MemorySearch:
+    """Per-user InvertedIndex instances, rebuilt lazily after invalidate()."""
+
+    def __init__(self):
+        self._indexes: Dict[str, InvertedIndex] = {}
+
+    async def search(self, collection, username: str, query: str, offset: int, limit: int) -> List[Tuple[dict, float]]:
+        index = self._indexes.get(username)
+        if index is None:
+            notes = [note async for note in collection.find({"username": username, "deleted_at": None})]
+            index = self._indexes[username] = InvertedIndex(notes)
+        return index.search(search_terms(query))[offset:offset + limit]
+
+    def invalidate(self, username: str):
+        self._indexes.pop(username, None)
+
+
+async def mongo_search(collection, username: str, query: str, offset: int, limit: int) -> List[Tuple[dict, float]]:
+    """$text search on the compound (username, title, content) text index, best matches first."""
+    score = {"$meta": "textScore"}
+    cursor = (
+        collection.find(
+            {"username": username, "deleted_at": None, "$text": {"$search": query}},
+            {"title": 1, "content": 1, "created_at": 1, "updated_at": 1, "score": score},
+        )
+        .sort([("score", score), ("_id", -1)])
+        .skip(offset)
+        .limit(limit)
+    )
+    return [(note, note.pop("score")) async for note in cursor]
@@ -0,0 +1,99 @@
+"""
+Latency of the notes backend's hot queries with and without the startup indexes.
+
+Seeds `notes_bench.notes` with 1M notes spread over a number of users (reused on later
+runs when the count already matches), then times each query twice: once with only the
+`_id` index and once after backend/database.py's ensure_indexes() has run. The plan
+stages reported by check_query_plans() are printed for both runs:
+
+    python index_scan.py --mongo-url mongodb://localhost:27017 --notes 1000000 --users 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+parser.add_argument("--db", default="notes_bench")
+parser.add_argument("--notes", type=int, default=1_000_000)
+parser.add_argument("--users", type=int, default=1000)
+parser.add_argument("--repeat", type=int, default=20)
+args = parser.parse_args()
+
+# database.py reads its connection settings at import time
+os.environ["MONGO_URL"] = args.mongo_url
+os.environ["DB_NAME"] = args.db
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from database import db, ensure_indexes, check_query_plans  # noqa: E402
+
+
+async def seed(notes: int, users: int, batch: int = 10_000):
+    if await db.notes.estimated_document_count() == notes:
+        return
+    await db.notes.drop()
+    await db.users.drop()
+    await db.users.insert_many([{"username": f"user{i}", "hashed_password": "x"} for i in range(users)])
+    start_time = datetime.utcnow() - timedelta(days=365)
+    for start in range(0, notes, batch):
+        await db.notes.insert_many(
+            [
+                {
+                    "username": f"user{random.randrange(users)}",
+                    "title": f"Note {i}",
+                    "content": "Lorem ipsum dolor sit amet " * 8,
+                    "created_at": start_time + timedelta(seconds=i * 30),
+                    "updated_at": start_time + timedelta(seconds=i * 30),
+                }
+                for i in range(start, min(start + batch, notes))
+            ],
+            ordered=False,
+        )
+
+
+async def time_queries(users: int, repeat: int) -> dict:
+    sample = await db.notes.find_one({}, {"_id": 1, "username": 1})
+    queries = {
+        "notes by user, newest first": lambda user: db.notes.find({"username": user}).sort("created_at", -1).to_list(None),
+        "note by id and owner": lambda user: db.notes.find_one({"_id": sample["_id"], "username": sample["username"]}),
+        "user by username": lambda user: db.users.find_one({"username": user}),
+    }
+    results = {}
+    for name, query in queries.items():
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await query(f"user{random.randrange(users)}")
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        results[name] = (statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1])
+    return results
+
+
+def report(label: str, results: dict, problems: list):
+    print(label)
+    for name, (p50, p95) in results.items():
+        print(f"  {name:30s} p50 {p50:9.2f} ms  p95 {p95:9.2f} ms")
+    for problem in problems:
+        print(f"  unindexed: {problem}")
+
+
+async def main():
+    print(f"seeding {args.notes} notes for {args.users} users ...")
+    await seed(args.notes, args.users)
+
+    await db.notes.drop_indexes()
+    await db.users.drop_indexes()
+    report("without indexes", await time_queries(args.users, args.repeat), await check_query_plans())
+
+    await ensure_indexes()
+    report("with indexes", await time_queries(args.users, args.repeat), await check_query_plans())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
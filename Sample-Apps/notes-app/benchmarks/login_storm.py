@@ -0,0 +1,81 @@
+"""
+GET /notes latency on a running backend while logins are hammered.
+
+Measures p50/p99 of `GET /notes?limit=50` first on an idle backend, then while
+--login-concurrency clients loop on POST /auth/login. With bcrypt on the hash pool the
+two runs should be close; logins beyond HASH_QUEUE_LIMIT come back as 503:
+
+    python login_storm.py --url http://localhost:8000 --seconds 15 --login-concurrency 64
+"""
+import argparse
+import asyncio
+import collections
+import statistics
+import time
+
+import httpx
+
+USERNAME = "storm-bench"
+PASSWORD = "storm-bench-password"
+
+
+async def prepare(client: httpx.AsyncClient, notes: int) -> dict:
+    await client.post("/auth/register", json={"username": USERNAME, "password": PASSWORD})
+    response = await client.post("/auth/login", data={"username": USERNAME, "password": PASSWORD})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    existing = len((await client.get("/notes", params={"limit": notes}, headers=headers)).json()["notes"])
+    for i in range(existing, notes):
+        await client.post("/notes", json={"title": f"Note {i}", "content": "Lorem ipsum " * 20}, headers=headers)
+    return headers
+
+
+async def read_notes(client: httpx.AsyncClient, headers: dict, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/notes", params={"limit": 50}, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+
+
+async def login_loop(client: httpx.AsyncClient, deadline: float, statuses: collections.Counter):
+    while time.perf_counter() < deadline:
+        response = await client.post("/auth/login", data={"username": USERNAME, "password": PASSWORD})
+        statuses[response.status_code] += 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+
+
+async def run(client: httpx.AsyncClient, headers: dict, seconds: float, readers: int, logins: int):
+    deadline = time.perf_counter() + seconds
+    latencies: list = []
+    statuses: collections.Counter = collections.Counter()
+    await asyncio.gather(
+        *(read_notes(client, headers, deadline, latencies) for _ in range(readers)),
+        *(login_loop(client, deadline, statuses) for _ in range(logins)),
+    )
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], len(latencies), statuses
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--login-concurrency", type=int, default=64)
+    parser.add_argument("--notes", type=int, default=50)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.readers + args.login_concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        headers = await prepare(client, args.notes)
+        for label, logins in (("idle", 0), (f"{args.login_concurrency} concurrent logins", args.login_concurrency)):
+            p50, p99, count, statuses = await run(client, headers, args.seconds, args.readers, logins)
+            print(f"GET /notes with {label}: p50 {p50:.1f} ms  p99 {p99:.1f} ms  ({count} requests)")
+            if statuses:
+                print(f"  login responses: {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""
+Latency of update_note / delete_note before and after the single-round-trip rewrite,
+with an artificial network delay between the driver and a local mongod.
+
+The delay comes from a small TCP proxy started by this script, so no `tc netem` or
+root access is needed. Each direction is delayed by half of --rtt-ms:
+
+    python round_trips.py --mongo-host localhost --mongo-port 27017 --rtt-ms 2 10 40
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+DB_NAME = "notes_bench_round_trips"
+
+
+async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float):
+    """Forward bytes after `delay` seconds without serializing the delays of consecutive chunks."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def sender():
+        while True:
+            due, data = await queue.get()
+            if data is None:
+                break
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    task = asyncio.ensure_future(sender())
+    try:
+        while data := await reader.read(65536):
+            queue.put_nowait((loop.time() + delay, data))
+    finally:
+        queue.put_nowait((0.0, None))
+        await task
+
+
+async def start_delay_proxy(host: str, port: int, rtt: float) -> asyncio.AbstractServer:
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(host, port)
+        await asyncio.gather(
+            pipe(client_reader, server_writer, rtt / 2),
+            pipe(server_reader, client_writer, rtt / 2),
+            return_exceptions=True,
+        )
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def legacy_update(db, oid: ObjectId, username: str):
+    existing = await db.notes.find_one({"_id": oid, "username": username})
+    if not existing:
+        return None
+    await db.notes.update_one({"_id": oid}, {"$set": {"title": "updated", "updated_at": datetime.utcnow()}})
+    return await db.notes.find_one({"_id": oid})
+
+
+async def atomic_update(db, oid: ObjectId, username: str):
+    return await db.notes.find_one_and_update(
+        {"_id": oid, "username": username},
+        {"$set": {"title": "updated", "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def legacy_delete(db, oid: ObjectId, username: str):
+    existing = await db.notes.find_one({"_id": oid, "username": username})
+    if not existing:
+        return False
+    await db.notes.delete_one({"_id": oid})
+    return True
+
+
+async def atomic_delete(db, oid: ObjectId, username: str):
+    result = await db.notes.delete_one({"_id": oid, "username": username})
+    return result.deleted_count == 1
+
+
+async def measure(db, operation, repeat: int) -> tuple:
+    now = datetime.utcnow()
+    result = await db.notes.insert_many(
+        [{"username": "bench", "title": "t", "content": "c", "created_at": now, "updated_at": now} for _ in range(repeat)]
+    )
+    latencies = []
+    for oid in result.inserted_ids:
+        started = time.perf_counter()
+        await operation(db, oid, "bench")
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-host", default="localhost")
+    parser.add_argument("--mongo-port", type=int, default=27017)
+    parser.add_argument("--rtt-ms", type=float, nargs="+", default=[0.0, 2.0, 10.0, 40.0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    operations = {
+        "update (find_one + update_one + find_one)": legacy_update,
+        "update (find_one_and_update)": atomic_update,
+        "delete (find_one + delete_one)": legacy_delete,
+        "delete (delete_one on _id + username)": atomic_delete,
+    }
+    for rtt_ms in args.rtt_ms:
+        proxy = await start_delay_proxy(args.mongo_host, args.mongo_port, rtt_ms / 1000)
+        proxy_port = proxy.sockets[0].getsockname()[1]
+        client = AsyncIOMotorClient(f"mongodb://127.0.0.1:{proxy_port}/?directConnection=true")
+        db = client[DB_NAME]
+        await db.notes.drop()
+        print(f"rtt {rtt_ms:g} ms")
+        for name, operation in operations.items():
+            p50, p95 = await measure(db, operation, args.repeat)
+            print(f"  {name:45s} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms")
+        await db.notes.drop()
+        client.close()
+        proxy.close()
+        await proxy.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
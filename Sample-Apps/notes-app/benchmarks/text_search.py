@@ -0,0 +1,118 @@
+"""
+GET /notes/search backends over a 1M-note corpus.
+
+Seeds `notes_bench_search.notes` (reused on later runs when the count already matches)
+with generated notes spread over --users users, then for random users and queries
+times:
+
+  * a case-insensitive $regex over title and content (what search costs without an index)
+  * $text on the (username, title, content) text index, as backend/search.py runs it
+  * the in-process InvertedIndex fallback: build time once per user, then query time
+
+    python text_search.py --mongo-url mongodb://localhost:27017 --notes 1000000 --users 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from search import InvertedIndex, mongo_search, search_terms  # noqa: E402
+
+VOCABULARY = (
+    "meeting budget project deadline coffee grocery milk bread running training plan travel "
+    "flight hotel invoice payment doctor appointment birthday gift recipe pasta garden tomato "
+    "kubernetes docker terraform release deploy incident review backlog sprint retro design"
+).split()
+QUERIES = ["budget", "running plan", "deploy incident", "grocery milk", "kubernetes release", "doctor"]
+
+
+def generate_note(rng: random.Random, username: str, created_at: datetime) -> dict:
+    return {
+        "username": username,
+        "title": " ".join(rng.choices(VOCABULARY, k=3)).capitalize(),
+        "content": " ".join(rng.choices(VOCABULARY, k=rng.randint(20, 80))),
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+async def seed(collection, notes: int, users: int, batch: int = 10_000):
+    if await collection.estimated_document_count() == notes:
+        return
+    await collection.drop()
+    rng = random.Random(0)
+    start_time = datetime.utcnow() - timedelta(days=365)
+    for start in range(0, notes, batch):
+        await collection.insert_many(
+            [
+                generate_note(rng, f"user{i % users}", start_time + timedelta(seconds=i * 30))
+                for i in range(start, min(start + batch, notes))
+            ],
+            ordered=False,
+        )
+    await collection.create_index(
+        [("username", 1), ("title", "text"), ("content", "text")],
+        name="notes_text",
+        weights={"title": 3, "content": 1},
+    )
+    await collection.create_index([("username", 1), ("created_at", -1), ("_id", -1)])
+
+
+async def regex_search(collection, username: str, query: str, offset: int, limit: int):
+    pattern = {"$regex": "|".join(re.escape(term) for term in search_terms(query)), "$options": "i"}
+    cursor = collection.find({"username": username, "$or": [{"title": pattern}, {"content": pattern}]})
+    return await cursor.skip(offset).limit(limit).to_list(None)
+
+
+def percentiles(latencies: list) -> str:
+    latencies = sorted(latencies)
+    return f"p50 {statistics.median(latencies):9.2f} ms  p95 {latencies[int(len(latencies) * 0.95) - 1]:9.2f} ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    collection = AsyncIOMotorClient(args.mongo_url)["notes_bench_search"]["notes"]
+    print(f"seeding {args.notes} notes for {args.users} users ...")
+    await seed(collection, args.notes, args.users)
+
+    rng = random.Random(1)
+    cases = [(f"user{rng.randrange(args.users)}", rng.choice(QUERIES)) for _ in range(args.repeat)]
+    for name, search in (("$regex scan", regex_search), ("$text index", mongo_search)):
+        latencies = []
+        for username, query in cases:
+            started = time.perf_counter()
+            await search(collection, username, query, 0, args.limit)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"{name:24s} {percentiles(latencies)}")
+
+    build_times, query_latencies = [], []
+    for username in sorted({username for username, _ in cases})[:5]:
+        started = time.perf_counter()
+        index = InvertedIndex([note async for note in collection.find({"username": username})])
+        build_times.append((time.perf_counter() - started) * 1000)
+        for query in QUERIES:
+            started = time.perf_counter()
+            index.search(search_terms(query))[: args.limit]
+            query_latencies.append((time.perf_counter() - started) * 1000)
+    print(f"{'in-process index build':24s} {statistics.mean(build_times):9.2f} ms per user ({args.notes // args.users} notes)")
+    print(f"{'in-process index query':24s} {percentiles(query_latencies)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())